@@ -0,0 +1,75 @@
+from array import array
+
+LANES = ("DON", "KA")
+
+class StepStats:
+    """
+    Live per-slot, per-lane accuracy. Mean and variance of the timing error are
+    updated with Welford's method and misses are counted, all in preallocated
+    arrays indexed [lane * slots + step], so each judgment is O(1) and nothing is
+    kept per hit. Errors are in seconds, positive = late.
+    """
+    def __init__(self, slots=32):
+        self.slots = slots
+        n = slots * len(LANES)
+        self.count = array('l', [0]) * n; self.misses = array('l', self.count)
+        self.mean = array('d', [0.0]) * n; self.m2 = array('d', self.mean)
+
+    def reset(self):
+        for buf in (self.count, self.misses, self.mean, self.m2):
+            for i in range(len(buf)): buf[i] = 0
+
+    def index(self, lane, step): return LANES.index(lane) * self.slots + step
+
+    def add(self, lane, step, error):
+        """Record one judgment; `error` None counts a miss."""
+        if not 0 <= step < self.slots: return
+        i = self.index(lane, step)
+        if error is None: self.misses[i] += 1; return
+        n = self.count[i] + 1; self.count[i] = n
+        delta = error - self.mean[i]
+        self.mean[i] += delta / n
+        self.m2[i] += delta * (error - self.mean[i])
+
+    def variance(self, i):
+        n = self.count[i]
+        return self.m2[i] / (n - 1) if n > 1 else 0.0
+
+    def miss_rate(self, i):
+        total = self.count[i] + self.misses[i]
+        return self.misses[i] / total if total else 0.0
+
+    def cell(self, lane, step):
+        """(hits, mean error, std dev, miss rate) for one slot of one lane."""
+        i = self.index(lane, step)
+        return self.count[i], self.mean[i], self.variance(i) ** 0.5, self.miss_rate(i)
+
+class DriftEstimator:
+    """
+    Online timing-bias detector. An exponential moving average of recent hit
+    errors (seconds, positive = late) tracks drift within a session in O(1) per
+    hit. A bias is flagged once |EMA| passes `enter` and cleared only when it
+    falls below `exit`, so the verdict doesn't flicker around the threshold.
+    """
+    def __init__(self, alpha=0.1, enter=0.012, exit=0.006, min_hits=16):
+        self.alpha, self.enter, self.exit, self.min_hits = alpha, enter, exit, min_hits
+        self.reset()
+
+    def reset(self):
+        self.ema = 0.0; self.hits = 0; self.bias = 0  # -1 early, +1 late
+
+    def add(self, error):
+        self.hits += 1
+        # Plain mean until the EMA has warmed up, so the first hits aren't over-weighted
+        self.ema += (error - self.ema) * max(self.alpha, 1.0 / self.hits)
+        if self.hits < self.min_hits: return
+        if self.bias and abs(self.ema) < self.exit: self.bias = 0
+        elif not self.bias and abs(self.ema) > self.enter: self.bias = 1 if self.ema > 0 else -1
+
+    def suggested_offset(self, offset):
+        """Offset that would cancel the current bias, or None while no bias is flagged."""
+        return offset + self.ema if self.bias else None
+
+    def applied(self, correction):
+        """The offset moved by `correction`: future errors shift by it, so the EMA shifts too and keeps averaging."""
+        self.ema -= correction; self.bias = 0
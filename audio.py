@@ -3,6 +3,26 @@ import os
 import array
 import math
 import sys
+import time
+import heapq
+import threading
+import mmap
+import hashlib
+import operator
+from itertools import accumulate, chain, repeat
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PCM_CACHE_DIR = "pcm_cache"
+DEFAULT_FREQUENCY, DEFAULT_BUFFER = 44100, 512
+# Reserved mixer channels per voice, after channel 0 (the scheduler stream). Hits
+# rotate through their own pool, so a dense stream can't steal the metronome's channel.
+VOICE_CHANNELS = {"don": 4, "ka": 4, "metro_tick": 2}
+# Mixer configs tried by calibrate(), lowest buffer latency first
+CALIBRATION_CANDIDATES = sorted([(f, b) for f in (48000, 44100) for b in (128, 256, 512)], key=lambda c: c[1] / c[0])
 
 # --- PYINSTALLER PATH FIX ---
 def resource_path(relative_path):
@@ -14,24 +34,305 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def _mul(values, k): return map(operator.mul, values, repeat(k))
+def _add(values, k): return map(operator.add, values, repeat(k))
+
+def _line(start, step, count):
+    """start, start + step, ... (count values) as a running sum."""
+    return accumulate(repeat(step, count - 1), operator.add, initial=start) if count > 0 else ()
+
+def _flat_envelope(n):
+    hold = min(n, math.ceil(0.95 * n))
+    # Short release to avoid a click
+    return chain(repeat(1.0, hold), _line((1.0 - hold / n) * 20.0, -20.0 / n, n - hold))
+
+# Waveforms over an iterable of phases p (in cycles, any size) scaled to `amp`, and
+# envelopes of n samples over normalized time i / n. They are chained map() and
+# accumulate() streams of operator and math functions, so no Python-level code runs per sample.
+WAVES = {
+    'sin': lambda p, amp: _mul(map(math.sin, _mul(p, 2 * math.pi)), amp),
+    'square': lambda p, amp: map((-amp, amp).__getitem__, map(operator.gt, map(math.sin, _mul(p, 2 * math.pi)), repeat(0.0))),
+    'saw': lambda p, amp: _add(_mul(map(operator.mod, p, repeat(1.0)), 2.0 * amp), -amp),
+    'triangle': lambda p, amp: map(operator.sub, repeat(amp), _mul(map(abs, _add(map(operator.mod, _add(p, 0.25), repeat(1.0)), -0.5)), 4.0 * amp)),
+}
+ENVELOPES = {
+    'linear': lambda n: _line(1.0, -1.0 / n, n),
+    'exp': lambda n: accumulate(repeat(math.exp(-5.0 / n), n - 1), operator.mul, initial=1.0),
+    'flat': _flat_envelope,
+}
+if np is not None:
+    NP_WAVES = {
+        'sin': lambda p: np.sin(2 * np.pi * p),
+        'square': lambda p: np.where(np.sin(2 * np.pi * p) > 0, 1.0, -1.0),
+        'saw': lambda p: 2.0 * p - 1.0,
+        'triangle': lambda p: 1.0 - 4.0 * np.abs(((p + 0.25) % 1.0) - 0.5),
+    }
+    NP_ENVELOPES = {
+        'linear': lambda x: 1.0 - x,
+        'exp': lambda x: np.exp(-5.0 * x),
+        'flat': lambda x: np.where(x < 0.95, 1.0, (1.0 - x) * 20.0),
+    }
+
+def synth_tone(freq, duration, wave_type='sin', envelope='linear', sample_rate=44100, channels=2, amplitude=0.4):
+    """
+    Render a tone to interleaved int16 PCM bytes with every channel carrying the signal.
+    Uses NumPy when available. Otherwise the waveform and envelope are chained
+    map()/itertools streams (see WAVES/ENVELOPES); for integer frequencies only one
+    exact waveform period is computed and then tiled.
+    """
+    n = int(sample_rate * duration); scale = 32767 * amplitude
+    if n <= 0: return b""
+    if np is not None:
+        phase = (freq * np.arange(n) / sample_rate) % 1.0
+        mono = (scale * NP_WAVES[wave_type](phase) * NP_ENVELOPES[envelope](np.arange(n) / n)).astype(np.int16)
+        return np.repeat(mono, channels).tobytes()
+
+    # Integer frequencies repeat exactly every sample_rate / gcd samples
+    period = sample_rate // math.gcd(sample_rate, int(freq)) if float(freq).is_integer() and freq > 0 else n
+    period = min(period, n)
+    cycle = list(WAVES[wave_type](_mul(range(period), freq / sample_rate), scale))
+    tiled = chain.from_iterable(repeat(cycle, n // period + 1))
+    mono = array.array('h', list(map(int, map(operator.mul, tiled, ENVELOPES[envelope](n)))))
+    if channels == 1: return mono.tobytes()
+    out = array.array('h', bytes(2 * n * channels))
+    for c in range(channels): out[c::channels] = mono
+    return out.tobytes()
+
+class PCMCache:
+    """Raw PCM blobs on disk keyed by a parameter string, memory-mapped when loaded."""
+    def __init__(self, directory=PCM_CACHE_DIR):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".pcm")
+
+    def load(self, key):
+        """Read-only mmap of the cached PCM, or None on a miss."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0: return None
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError: return None
+
+    def store(self, key, data):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self.path(key) + ".tmp"
+            with open(tmp, 'wb') as f: f.write(data)
+            os.replace(tmp, self.path(key))
+        except OSError: pass
+
+class AudioScheduler:
+    """
+    Ahead-of-time mixer. Sounds are scheduled for an absolute time, converted to a
+    sample frame and mixed into fixed-size PCM chunks at that exact offset. The
+    chunks are streamed through one reserved mixer channel with Channel.queue(),
+    fed by a background thread, so timing no longer depends on the frame loop.
+    render() has no mixer dependency and can be driven offline.
+    """
+    def __init__(self, voice_source, sample_rate=44100, channels=2, chunk_frames=512, clock=time.perf_counter):
+        self.voice_source = voice_source  # name -> interleaved array('h') at the current volume
+        self.sample_rate, self.channels, self.chunk_frames = sample_rate, channels, chunk_frames
+        self.clock = clock
+        self.events = []; self.seq = 0  # heap of (frame, seq, name)
+        self.pending = []  # (name, at_time) scheduled before the stream has a t0
+        self.active = []  # [start_frame, voice samples]
+        self.lock = threading.Lock()
+        self.pos = 0  # Next sample frame to render
+        self.t0 = None  # Clock time of sample frame 0
+        self.late_events = 0; self.underruns = 0
+        self.channel = None; self.thread = None; self.running = False
+
+    def time_to_frame(self, at_time):
+        return int(round((at_time - self.t0) * self.sample_rate))
+
+    def schedule(self, name, at_time):
+        """Play `name` at absolute clock time `at_time`. Held back until the stream has a t0."""
+        with self.lock:
+            if self.t0 is None: self.pending.append((name, at_time)); return
+            heapq.heappush(self.events, (self.time_to_frame(at_time), self.seq, name)); self.seq += 1
+
+    def schedule_frame(self, name, frame):
+        with self.lock:
+            heapq.heappush(self.events, (frame, self.seq, name)); self.seq += 1
+
+    def clear(self):
+        # A new list rather than clear(), so render() can tell its snapshot went stale
+        with self.lock: self.events.clear(); self.pending.clear(); self.active = []
+
+    def anchor(self, t0):
+        """Set the clock time of sample frame 0 and place events buffered before it."""
+        with self.lock:
+            self.t0 = t0
+            for name, at_time in self.pending:
+                heapq.heappush(self.events, (self.time_to_frame(at_time), self.seq, name)); self.seq += 1
+            self.pending.clear()
+
+    def render(self, n_frames=None):
+        """Mix the next chunk of the stream and return it as interleaved array('h')."""
+        n_frames = n_frames or self.chunk_frames
+        ch = self.channels; start = self.pos; end = start + n_frames
+        out = array.array('h', bytes(2 * n_frames * ch))
+        with self.lock:
+            while self.events and self.events[0][0] < end:
+                frame, _, name = heapq.heappop(self.events)
+                voice = self.voice_source(name)
+                if voice is None: continue
+                # Already-rendered frames can't be changed: play late rather than drop
+                if frame < start: self.late_events += 1; frame = start
+                self.active.append([frame, voice])
+            self.active.sort(key=lambda v: v[0])
+            active = self.active
+
+        covered = 0; still_active = []
+        for frame, voice in active:
+            dst = max(0, frame - start) * ch
+            src = max(0, start - frame) * ch
+            n = min(len(voice) - src, len(out) - dst)
+            if n <= 0: continue
+            # Overlapping part is summed with clipping, the rest is a plain slice copy
+            mix_end = min(dst + n, covered)
+            for i in range(dst, mix_end):
+                v = out[i] + voice[src + i - dst]
+                out[i] = 32767 if v > 32767 else (-32768 if v < -32768 else v)
+            if mix_end < dst + n:
+                copy_from = max(dst, mix_end)
+                out[copy_from:dst + n] = voice[src + copy_from - dst:src + n]
+            covered = max(covered, dst + n)
+            if src + n < len(voice): still_active.append([frame, voice])
+        with self.lock:
+            # clear() during the mix replaced the list: keep it empty
+            if self.active is active: self.active = still_active
+        self.pos = end
+        return out
+
+    def start(self, channel):
+        """Begin streaming through `channel` from a background feeder thread."""
+        self.channel = channel; self.running = True
+        self.thread = threading.Thread(target=self._feed, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread: self.thread.join(timeout=0.5)
+        if self.channel: self.channel.stop()
+
+    def _feed(self):
+        chunk_sec = self.chunk_frames / self.sample_rate
+        while self.running:
+            if not self.channel.get_busy():
+                # Stream (re)start: anchor the clock so frame `pos` plays now
+                if self.t0 is not None: self.underruns += 1
+                self.anchor(self.clock() - self.pos / self.sample_rate)
+                self.channel.play(pygame.mixer.Sound(buffer=self.render()))
+            if self.channel.get_queue() is None:
+                self.channel.queue(pygame.mixer.Sound(buffer=self.render()))
+            time.sleep(chunk_sec / 4)
+
+def voice_volume_key(name): return "metro" if "metro" in name else name
+
+def _game_load(stop, tick=0.001, duty=0.5):
+    """Stand-in for the game's own threads while probing: Python work for `duty` of every `tick`."""
+    while not stop.is_set():
+        end = time.perf_counter() + tick * duty; n = 0
+        while time.perf_counter() < end: n += 1
+        time.sleep(tick * (1 - duty))
+
+def probe_mixer(frequency, buffer, duration=1.5, hits_per_sec=40, load_threads=2):
+    """
+    Mixing-timing harness for one mixer config: stream a dense click track through
+    AudioScheduler for `duration` seconds and watch for underruns (the stream ran
+    dry), late events and chunk mixes that eat more than a quarter of a chunk's
+    playback time. `load_threads` threads compete for the GIL meanwhile, like the
+    sim tick, rendering and the pattern worker do in play, so a config is only
+    called stable with headroom. Returns (stable, report). Leaves the mixer closed.
+    """
+    pygame.mixer.quit()
+    report = {"frequency": frequency, "buffer": buffer, "latency_ms": round(buffer / frequency * 1000, 2)}
+    try: pygame.mixer.init(frequency=frequency, size=-16, channels=2, buffer=buffer)
+    except pygame.error as e: report["error"] = str(e); return False, report
+    got = pygame.mixer.get_init()
+    if not got or got[0] != frequency or got[1] != -16:
+        report["error"] = f"mixer opened as {got}"; pygame.mixer.quit(); return False, report
+    click = array.array('h'); click.frombytes(synth_tone(800, 0.03, 'sin', 'linear', frequency, got[2]))
+    sched = AudioScheduler(lambda name: click, frequency, got[2], buffer)
+    costs = []; render = sched.render
+    def timed_render(n_frames=None):
+        t0 = time.perf_counter(); out = render(n_frames); costs.append(time.perf_counter() - t0); return out
+    sched.render = timed_render
+    stop = threading.Event()
+    for _ in range(load_threads): threading.Thread(target=_game_load, args=(stop,), daemon=True).start()
+    pygame.mixer.set_reserved(1); sched.start(pygame.mixer.Channel(0))
+    deadline = time.perf_counter() + 1.0
+    while sched.t0 is None and time.perf_counter() < deadline: time.sleep(0.001)
+    if sched.t0 is not None:
+        start = time.perf_counter() + 0.1
+        for i in range(int(duration * hits_per_sec)): sched.schedule("click", start + i / hits_per_sec)
+    time.sleep(duration + 0.2)
+    sched.stop(); stop.set(); pygame.mixer.quit()
+    chunk_sec = buffer / frequency
+    worst = max(costs) if costs else float("inf")
+    report.update(underruns=sched.underruns, late_events=sched.late_events, worst_mix_ms=round(worst * 1000, 3))
+    return sched.underruns == 0 and sched.late_events == 0 and worst < chunk_sec / 4, report
+
+def calibrate(candidates=CALIBRATION_CANDIDATES, duration=1.5):
+    """
+    Probe mixer configs from the lowest latency up and return the first stable one
+    as (frequency, buffer, reports); falls back to the defaults if none is stable.
+    """
+    reports = []
+    for frequency, buffer in candidates:
+        stable, report = probe_mixer(frequency, buffer, duration); report["stable"] = stable
+        reports.append(report)
+        if stable: return frequency, buffer, reports
+    return DEFAULT_FREQUENCY, DEFAULT_BUFFER, reports
+
 class AudioManager:
     """
     Manages high-performance audio playback.
-    Optimized for low latency in rhythm games using a reduced buffer size (512).
+    Optimized for low latency in rhythm games using a reduced buffer size (512 by
+    default; calibrate() finds the lowest stable size for this machine).
     """
-    def __init__(self):
+    def __init__(self, load_sounds=True, frequency=DEFAULT_FREQUENCY, buffer=DEFAULT_BUFFER):
         # Initialize the mixer with a low buffer to minimize input-to-audio lag.
         try:
-            pygame.mixer.pre_init(44100, -16, 2, 512)
+            pygame.mixer.pre_init(frequency, -16, 2, buffer)
             pygame.mixer.init()
         except:
             # Fallback if pre_init is not supported by the system
-            pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+            pygame.mixer.init(frequency=frequency, size=-16, channels=2, buffer=buffer)
+        self.buffer = buffer
             
         self.sounds = {}
         self.volumes = {"don": 0.8, "ka": 0.8, "metro": 0.5}
-        
-        # Load sounds, prioritizing generated .wav files, then falling back to .ogg
+        self.mixer_format = pygame.mixer.get_init() or (44100, -16, 2)
+        self.pcm_cache = PCMCache()
+
+        # Sample-accurate stream for metronome ticks and demo hits (int16 mixer only)
+        self.scaled_pcm = {}
+        self.scheduler = None
+        freq, fmt, channels = pygame.mixer.get_init() or (0, 0, 0)
+        # Channel 0 carries the scheduler stream; every voice then gets its own
+        # reserved channels, so Sound.play() elsewhere can never take them
+        first = 1 if fmt == -16 else 0
+        total = first + sum(VOICE_CHANNELS.values())
+        self.pools = {}  # name -> [channels, next index]
+        if freq:
+            pygame.mixer.set_num_channels(max(8, total)); pygame.mixer.set_reserved(total)
+            for name, count in VOICE_CHANNELS.items():
+                self.pools[name] = [[pygame.mixer.Channel(first + k) for k in range(count)], 0]; first += count
+            for key, val in self.volumes.items(): self.set_volume(key, val)
+        if fmt == -16:
+            self.scheduler = AudioScheduler(self.get_scaled_pcm, freq, channels, buffer)
+            self.scheduler.start(pygame.mixer.Channel(0))
+        if load_sounds: self.load_sounds()
+
+    def load_sounds(self):
+        """
+        Load every sound, prioritizing generated .wav files, then falling back to .ogg.
+        Split from __init__ so startup can run it on a loader thread once the mixer is up.
+        """
         # We use resource_path() to wrap every file path!
         self.load_sound_flexible("don", [resource_path("assets/don.wav"), resource_path("assets/don.ogg")], 200, 'square')
         self.load_sound_flexible("ka", [resource_path("assets/ka.wav"), resource_path("assets/ka.ogg")], 450, 'square')
@@ -46,7 +347,7 @@ class AudioManager:
         for path in paths:
             if os.path.exists(path):
                 try:
-                    self.sounds[name] = pygame.mixer.Sound(path)
+                    self.sounds[name] = self.load_decoded(path)
                     sound_loaded = True
                     break  # Exit on the first successfully loaded file
                 except:
@@ -56,30 +357,58 @@ class AudioManager:
             # If no file exists or is readable, use the internal synthesizer
             self.sounds[name] = self.generate_tone(fallback_freq, wave_type=wave)
 
-    def generate_tone(self, freq, duration=0.08, wave_type='sin'):
+    def sound_from_cache(self, key, produce):
+        """Sound from the on-disk PCM cache, calling produce() for the raw bytes on a miss."""
+        mm = self.pcm_cache.load(key)
+        if mm is not None:
+            try: return pygame.mixer.Sound(buffer=mm)  # Sound copies the buffer
+            finally: mm.close()
+        data = produce()
+        self.pcm_cache.store(key, data)
+        return pygame.mixer.Sound(buffer=data)
+
+    def load_decoded(self, path):
+        """Load an audio file, reusing its decoded PCM from the cache when the file is unchanged."""
+        st = os.stat(path)
+        key = f"file|{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{self.mixer_format}"
+        return self.sound_from_cache(key, lambda: pygame.mixer.Sound(path).get_raw())
+
+    def generate_tone(self, freq, duration=0.08, wave_type='sin', envelope='linear'):
         """Generates a clean procedural tone as an emergency audio fallback."""
-        sample_rate = 44100
-        n_samples = int(sample_rate * duration)
-        buf = array.array('h', [0] * n_samples)
-        
-        for i in range(n_samples):
-            val = math.sin(2 * math.pi * freq * i / sample_rate)
-            if wave_type == 'square': 
-                val = 1.0 if val > 0 else -1.0
-            
-            # Fade-out envelope to prevent audio "clicks" or popping at the end of the sound
-            envelope = 1.0 - (i / n_samples) 
-            buf[i] = int(32767 * 0.4 * val * envelope)
-            
-        return pygame.mixer.Sound(buf)
+        sample_rate, _, channels = self.mixer_format
+        key = f"tone|{freq}|{duration}|{wave_type}|{envelope}|{sample_rate}|{channels}"
+        return self.sound_from_cache(key, lambda: synth_tone(freq, duration, wave_type, envelope, sample_rate, channels))
+
+    def get_scaled_pcm(self, name):
+        """Raw samples of a sound with its current volume applied, cached per volume."""
+        if name not in self.sounds: return None
+        vol = self.volumes.get(voice_volume_key(name), 0.5)
+        cached = self.scaled_pcm.get(name)
+        if cached and cached[0] == vol: return cached[1]
+        raw = array.array('h', self.sounds[name].get_raw())
+        pcm = array.array('h', [int(v * vol) for v in raw])
+        self.scaled_pcm[name] = (vol, pcm)
+        return pcm
+
+    def schedule(self, name, at_time):
+        """Play at an exact perf_counter time via the stream; falls back to immediate play."""
+        if self.scheduler: self.scheduler.schedule(name, at_time)
+        else: self.play(name)
+
+    def close(self):
+        if self.scheduler: self.scheduler.stop()
 
     def play(self, name):
-        """Plays a preloaded sound using the current volume setting."""
-        if name in self.sounds:
-            vol_key = "metro" if "metro" in name else name
-            self.sounds[name].set_volume(self.volumes.get(vol_key, 0.5))
-            self.sounds[name].play()
+        """Plays a preloaded sound on the next channel of its voice pool (round-robin)."""
+        sound = self.sounds.get(name); pool = self.pools.get(name)
+        if sound is None: return
+        if pool is None: sound.set_volume(self.volumes.get(voice_volume_key(name), 0.5)); sound.play(); return
+        channels, i = pool
+        channels[i].play(sound); pool[1] = (i + 1) % len(channels)
 
     def set_volume(self, key, val):
-        """Updates the internal volume mapping for real-time adjustments."""
-        self.volumes[key] = val
\ No newline at end of file
+        """Updates the volume mapping and the voice channels using it (volume is per channel, not per hit)."""
+        self.volumes[key] = val
+        for name, (channels, _) in self.pools.items():
+            if voice_volume_key(name) == key:
+                for ch in channels: ch.set_volume(val)
\ No newline at end of file
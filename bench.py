@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import subprocess
+from array import array
+
+# Headless by default so the suite runs on CI boxes without a display or sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+BENCH_RESULTS = "bench_results.json"
+BENCH_BASELINE = "bench_baseline.json"
+TOLERANCE = 0.15  # Relative change that counts as a regression / improvement
+JUDGE_SIZES = (100, 1000, 10000, 100000)
+SUITES = ("judgment", "fonts", "render", "audio", "sequencer")
+
+def measure(fn, repeat=5, number=1):
+    """Median seconds per call of `fn` over `repeat` runs of `number` calls."""
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number): fn()
+        runs.append((time.perf_counter() - t0) / number)
+    runs.sort()
+    return runs[len(runs) // 2]
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def metric(value, unit, better="lower"):
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+# --- JUDGMENT ---
+def bench_judgment(sizes=JUDGE_SIZES, hits=5000):
+    """feed_input cost with `n` notes queued per session (the old try_hit_target over target_notes)."""
+    from engine import TrainerEngine
+    results = {}
+    for n in sizes:
+        engine = TrainerEngine(clock=lambda: 0.0)
+        engine.start(now=0.0)
+        # 16th notes at 150 BPM, alternating lanes
+        engine.push_notes([(i * 0.1, 'DON' if i % 2 else 'KA', i % 32, None) for i in range(n)], 0.0)
+        rng = random.Random(n); span = n * 0.1
+        stamps = [(rng.choice(('DON', 'KA')), rng.random() * span) for _ in range(hits)]
+        batches = iter(stamps[i:i + hits // 5] for i in range(0, hits, hits // 5))
+        def batch():
+            for lane, stamp in next(batches): engine.feed_input(lane, stamp)
+        results[f"judge.feed_input.n{n}"] = metric(measure(batch) / (hits // 5) * 1e6, "us/hit")
+    return results
+
+# --- FONTS ---
+FONT_SPECS = (("Arial", 18, True), ("Arial", 40, True), ("Consolas", 28, True), ("Arial", 64, True), ("Arial", 36, True))
+
+def bench_fonts(hits=500):
+    """
+    Startup font resolution and per-judgment font/text cost: SysFont (enumerates the
+    system fonts once per process, then a lookup per call) against FontRegistry with
+    a warm font_cache.json, plus Python bytes allocated per JudgmentText.
+    """
+    import pygame, pygame.sysfont, tracemalloc
+    import ui
+    pygame.font.init()
+    results = {}
+    # The platform scan behind SysFont's first call (initsysfonts() itself only runs once)
+    scan = {"win32": "initsysfonts_win32", "darwin": "initsysfonts_darwin"}.get(sys.platform, "initsysfonts_unix")
+    results["fonts.sysfont_enumerate"] = metric(measure(getattr(pygame.sysfont, scan), repeat=3) * 1000, "ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, "font_cache.json")
+        registry = ui.FontRegistry(cache_file); registry.preload([(f, b) for f, _, b in FONT_SPECS]); registry.save()
+        def warm():
+            r = ui.FontRegistry(cache_file)
+            for spec in FONT_SPECS: r.get(*spec)
+        results["fonts.registry_warm"] = metric(measure(warm, repeat=3) * 1000, "ms")
+    results["fonts.sysfont_per_hit"] = metric(measure(lambda: pygame.font.SysFont("Arial", 36, bold=True), number=hits) * 1e6, "us/hit")
+    results["fonts.judgment_text"] = metric(measure(lambda: ui.JudgmentText("GOOD", (255, 220, 0)), number=hits) * 1e6, "us/hit")
+    # Python heap only; the surface pixels live in SDL
+    tracemalloc.start(); before = tracemalloc.get_traced_memory()[0]
+    texts = [ui.JudgmentText("GOOD", (255, 220, 0)) for _ in range(hits)]
+    results["fonts.judgment_text_alloc"] = metric((tracemalloc.get_traced_memory()[0] - before) / hits, "B/hit")
+    tracemalloc.stop(); del texts
+    return results
+
+# --- RENDER / STARTUP (one child process per run) ---
+def render_child(frames):
+    """
+    Run main.main() with the settings file named in BENCH_SETTINGS and print its
+    frame timings and startup milestones as JSON. Runs in its own process so every run is a cold start.
+    """
+    t_start = time.perf_counter()
+    import pygame
+    import main
+    import render
+    from profiler import FrameProfiler, StartupTrace
+    main.CONFIG_FILE = os.environ["BENCH_SETTINGS"]
+    # The trace goes next to the settings file in the run's temp dir, not into the cwd
+    trace_path = os.path.join(os.path.dirname(main.CONFIG_FILE), "startup_trace.json")
+    main.StartupTrace = lambda t0, enabled: StartupTrace(t0, enabled, trace_path)
+    profilers = []
+    main.FrameProfiler = lambda *a, **k: profilers.append(FrameProfiler(*a, **k)) or profilers[-1]
+    state = {"frames": 0, "first_present": None}
+    flip, update = pygame.display.flip, pygame.display.update
+
+    def presented():
+        state["frames"] += 1
+        if state["first_present"] is None: state["first_present"] = time.perf_counter() - t_start
+        if state["frames"] == 3: pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE, mod=0, unicode=" ", scancode=0))
+        if state["frames"] == frames: pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+    pygame.display.flip = lambda: (presented(), flip())[1]
+    pygame.display.update = lambda *a: (presented(), update(*a))[1]
+    present = render.TextureCanvas.present
+    render.TextureCanvas.present = lambda self: (presented(), present(self))[1]
+    try: main.main()
+    except SystemExit: pass
+    # main's own --startup-trace milestones (time to first interactive frame)
+    try:
+        with open(trace_path, 'r') as f: interactive = json.load(f)["interactive"] / 1000 + main.STARTUP_T0 - t_start
+    except: interactive = 0.0
+    prof = profilers[0]
+    # Skip the first frames: startup, the session start and the first lane fill
+    cols = {name: list(prof.history(name))[30:] for name in prof.columns}
+    render = [sum(cols[p][i] for p in ("layout", "lane", "ui", "flip")) for i in range(len(cols["frame"]))]
+    print(json.dumps({"startup": state["first_present"], "interactive": interactive, "render": render, "lane": cols["lane"], "sim": [a + b for a, b in zip(cols["events"], cols["update"])]}))
+
+def run_render(hs_multiplier, frames, backend="software"):
+    settings = {"is_game_mode": True, "hs_multiplier": hs_multiplier, "custom_pattern": [1, 2, 1, 1] * 8,
+                "dirty_rects": False, "pacing_mode": "capped", "render_fps_cap": 1000,
+                "hit_log": False, "record_inputs": False, "render_backend": backend}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "settings.json")
+        with open(path, 'w') as f: json.dump(settings, f)
+        env = dict(os.environ, BENCH_SETTINGS=path)
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(frames), "--startup-trace"], env=env, capture_output=True, text=True, timeout=300)
+    lines = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    if not lines: raise RuntimeError(f"render child failed:\n{out.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+def bench_render(frames=240):
+    """
+    Full 1080p frame (dense pattern, game mode) at every scroll speed on both render
+    backends, plus cold start to first present. The texture backend runs on whatever
+    SDL renderer is available (SDL_RENDER_DRIVER=software on headless machines).
+    """
+    from main import SPEED_OPTIONS
+    results = {}; startups = []; interactive = []
+    for opt in SPEED_OPTIONS:
+        run = run_render(opt["val"], frames); startups.append(run["startup"]); interactive.append(run["interactive"])
+        key = f"render.frame.{opt['val']}x"
+        results[key + ".p50"] = metric(percentile(run["render"], 0.5) * 1000, "ms")
+        results[key + ".p95"] = metric(percentile(run["render"], 0.95) * 1000, "ms")
+        results[f"render.lane.{opt['val']}x.p50"] = metric(percentile(run["lane"], 0.5) * 1000, "ms")
+        run = run_render(opt["val"], frames, "gpu")
+        key = f"render.texture.frame.{opt['val']}x"
+        results[key + ".p50"] = metric(percentile(run["render"], 0.5) * 1000, "ms")
+        results[key + ".p95"] = metric(percentile(run["render"], 0.95) * 1000, "ms")
+    results["startup.first_present"] = metric(percentile(startups, 0.5) * 1000, "ms")
+    results["startup.interactive"] = metric(percentile(interactive, 0.5) * 1000, "ms")
+    return results
+
+# --- AUDIO ---
+def bench_audio():
+    import pygame
+    from audio import AudioManager, AudioScheduler, synth_tone
+    results = {}
+    results["audio.synth_tone"] = metric(measure(lambda: synth_tone(450, 0.08, 'square')) * 1000, "ms")
+
+    def construct():
+        manager = AudioManager(); manager.close(); pygame.mixer.quit()
+    results["audio.manager_init"] = metric(measure(construct, repeat=3) * 1000, "ms")
+    manager = AudioManager()
+    results["audio.generate_tone"] = metric(measure(lambda: manager.generate_tone(450, wave_type='square'), number=20) * 1000, "ms")
+    manager.close()
+
+    # One stream chunk with a few overlapping voices
+    voice = array('h', [1000] * 2 * 4000)
+    sched = AudioScheduler(lambda name: voice, clock=lambda: 0.0)
+    def chunk():
+        for k in range(3): sched.schedule_frame("v", sched.pos + k * 100)
+        sched.render()
+    results["audio.scheduler_chunk"] = metric(measure(chunk, number=50) * 1000, "ms")
+    pygame.mixer.quit()
+    return results
+
+# --- SEQUENCER ---
+def bench_sequencer():
+    import pygame
+    from main import PatternSequencer
+    from accuracy import StepStats
+    pygame.display.init()
+    screen = pygame.Surface((1920, 1080))
+    seq = PatternSequencer(50, 1030, 1820); seq.update_layout(50, 1030, 1820)
+    seq.set_pattern_data([1, 2, 1, 1] * 8)
+    stats = StepStats(seq.slots); rng = random.Random(0)
+    for i in range(2000): stats.add('DON' if rng.random() < 0.5 else 'KA', rng.randrange(seq.slots), rng.gauss(0, 0.02) if rng.random() < 0.9 else None)
+    results = {}
+    results["sequencer.draw"] = metric(measure(lambda: seq.draw(screen, 5), number=50) * 1000, "ms")
+    results["sequencer.draw_heat"] = metric(measure(lambda: seq.draw(screen, 5, stats), number=50) * 1000, "ms")
+    return results
+
+# --- BASELINE ---
+def compare(metrics, baseline, tolerance=TOLERANCE):
+    """{name: {baseline, current, ratio, status}} for every metric present in both runs."""
+    result = {}
+    for name, cur in metrics.items():
+        base = baseline.get(name)
+        if not base or not base["value"]: continue
+        ratio = cur["value"] / base["value"]
+        worse = ratio > 1 + tolerance if cur["better"] == "lower" else ratio < 1 - tolerance
+        better = ratio < 1 - tolerance if cur["better"] == "lower" else ratio > 1 + tolerance
+        result[name] = {"baseline": base["value"], "current": cur["value"], "ratio": round(ratio, 3), "status": "regressed" if worse else ("improved" if better else "ok")}
+    return result
+
+def run(suites=SUITES, frames=240):
+    import pygame
+    report = {"version": 1, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "pygame": pygame.version.ver, "platform": platform.platform(), "metrics": {}}
+    if "judgment" in suites: report["metrics"].update(bench_judgment())
+    if "fonts" in suites: report["metrics"].update(bench_fonts())
+    if "audio" in suites: report["metrics"].update(bench_audio())
+    if "sequencer" in suites: report["metrics"].update(bench_sequencer())
+    if "render" in suites: report["metrics"].update(bench_render(frames))
+    return report
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "--child":
+        render_child(int(sys.argv[2])); sys.exit()
+    import argparse
+    parser = argparse.ArgumentParser(description="Headless performance benchmarks. Writes JSON and compares it with a stored baseline.")
+    parser.add_argument("--only", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--frames", type=int, default=240, help="frames rendered per scroll speed")
+    parser.add_argument("--out", default=BENCH_RESULTS)
+    parser.add_argument("--baseline", default=BENCH_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--strict", action="store_true", help="exit 1 on any regression")
+    args = parser.parse_args()
+
+    report = run(args.only, args.frames)
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f: baseline = json.load(f)
+        report["comparison"] = compare(report["metrics"], baseline["metrics"], args.tolerance)
+    with open(args.out, 'w') as f: json.dump(report, f, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f: json.dump(report, f, indent=4)
+
+    for name, m in report["metrics"].items():
+        cmp = report.get("comparison", {}).get(name)
+        note = f"  ({cmp['ratio']:.2f}x baseline, {cmp['status']})" if cmp else ""
+        print(f"{name:34} {m['value']:12.4f} {m['unit']}{note}")
+    regressed = [n for n, c in report.get("comparison", {}).items() if c["status"] == "regressed"]
+    if regressed: print(f"{len(regressed)} regression(s): {', '.join(regressed)}", file=sys.stderr)
+    if args.strict and regressed: sys.exit(1)
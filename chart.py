@@ -0,0 +1,196 @@
+import os
+import mmap
+import struct
+import hashlib
+
+CHART_DIR = "charts"
+CHART_CACHE_DIR = "chart_cache"
+INDEX_MAGIC = b"UBTI"; INDEX_VERSION = 1
+
+# Note characters that map onto the two lanes; rolls (5-9) are ignored
+NOTE_LANES = {"1": "DON", "3": "DON", "2": "KA", "4": "KA"}
+EVENT_BPM, EVENT_DELAY = 0, 1
+
+# Index layout: header, then a fixed-width row per measure, the in-measure
+# events (BPM changes / delays) and finally the raw note characters
+HEADER = struct.Struct("<4sHHdIII")      # magic, version, pad, initial BPM, measures, events, notes bytes
+MEASURE = struct.Struct("<dHHIIII")      # BPM at measure start, meter num/den, notes offset/count, events offset/count
+EVENT = struct.Struct("<IBxxxd")         # slot index, kind, value
+
+def tokenize(lines):
+    """
+    Streaming TJA tokenizer. Yields ("header", key, value), ("command", name, arg),
+    ("notes", chars) and ("measure_end",) without holding the file in memory.
+    """
+    for line in lines:
+        line = line.split("//", 1)[0].strip()
+        if not line: continue
+        if line.startswith("#"):
+            name, _, arg = line[1:].partition(" ")
+            yield ("command", name.upper(), arg.strip()); continue
+        if ":" in line and not line[0].isdigit():
+            key, _, value = line.partition(":")
+            yield ("header", key.strip().upper(), value.strip()); continue
+        chars, sep, _ = line.partition(",")
+        chars = "".join(c for c in chars if c.isdigit())
+        if chars: yield ("notes", chars)
+        if sep: yield ("measure_end",)
+
+def parse_bpm(text):
+    """Tempo from a BPM: header or #BPMCHANGE; ValueError unless it is positive."""
+    bpm = float(text)
+    if not bpm > 0: raise ValueError(f"BPM must be positive, got {text}")
+    return bpm
+
+def course_matches(value, course):
+    names = {"0": "EASY", "1": "NORMAL", "2": "HARD", "3": "ONI", "4": "EDIT"}
+    return names.get(value, value.upper()) == course.upper()
+
+def build_index(tja_path, index_path, course="Oni"):
+    """
+    Parse one course of a TJA chart into the binary index. Tokens are consumed as
+    they stream in and each measure is packed as soon as its ',' is read, so the
+    parse keeps a few bytes per note rather than the text. Falls back to the first
+    course if `course` isn't in the file.
+    """
+    measures, events, notes = bytearray(), bytearray(), bytearray()
+    bpm = initial_bpm = 120.0; num, den = 4, 4
+    n_measures = n_events = 0
+    in_course = False; done = False
+    cur_notes = []; cur_events = []; start_bpm = bpm
+
+    def flush():
+        nonlocal n_measures, n_events, start_bpm
+        measures.extend(MEASURE.pack(start_bpm, num, den, len(notes), len(cur_notes), n_events, len(cur_events)))
+        notes.extend("".join(cur_notes).encode("ascii"))
+        for ev in cur_events: events.extend(EVENT.pack(*ev))
+        n_measures += 1; n_events += len(cur_events)
+        cur_notes.clear(); cur_events.clear(); start_bpm = bpm
+
+    for attempt in (course, None):
+        with open(tja_path, 'r', encoding="utf-8-sig", errors="replace") as f:
+            current_course = None
+            for token in tokenize(f):
+                kind = token[0]
+                if kind == "header":
+                    if token[1] == "BPM" and not in_course:
+                        try: bpm = initial_bpm = start_bpm = parse_bpm(token[2])
+                        except ValueError: pass
+                    elif token[1] == "COURSE": current_course = token[2]
+                elif kind == "command":
+                    name, arg = token[1], token[2]
+                    if name == "START":
+                        in_course = attempt is None or (current_course is not None and course_matches(current_course, attempt))
+                    elif not in_course: continue
+                    elif name == "END":
+                        if cur_notes or cur_events: flush()
+                        done = True; break
+                    elif name == "BPMCHANGE":
+                        try: bpm = parse_bpm(arg); cur_events.append((len(cur_notes), EVENT_BPM, bpm))
+                        except ValueError: pass
+                    elif name == "DELAY":
+                        try: cur_events.append((len(cur_notes), EVENT_DELAY, float(arg)))
+                        except ValueError: pass
+                    elif name == "MEASURE":
+                        try: a, b = arg.split("/"); num, den = int(a), int(b)
+                        except ValueError: pass
+                    # #SCROLL, #GOGOSTART, #BARLINEOFF etc. don't affect timing and are skipped
+                elif in_course:
+                    if kind == "notes": cur_notes.extend(token[1])
+                    else: flush()
+        if done or n_measures: break
+
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    tmp = index_path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, initial_bpm, n_measures, n_events, len(notes)))
+        f.write(measures); f.write(events); f.write(notes)
+    os.replace(tmp, index_path)
+
+class ChartIndex:
+    """Memory-mapped chart index. Measures are decoded only when asked for."""
+    def __init__(self, index_path):
+        with open(index_path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.initial_bpm, self.measures, n_events, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION: raise ValueError(f"{index_path}: bad chart index")
+        self.events_at = HEADER.size + self.measures * MEASURE.size
+        self.notes_at = self.events_at + n_events * EVENT.size
+
+    def __len__(self): return self.measures
+
+    def measure(self, i):
+        """(start BPM, num, den, note chars, [(slot, kind, value), ...]) of measure `i`."""
+        bpm, num, den, n_off, n_cnt, e_off, e_cnt = MEASURE.unpack_from(self.mm, HEADER.size + i * MEASURE.size)
+        chars = self.mm[self.notes_at + n_off:self.notes_at + n_off + n_cnt].decode("ascii")
+        events = [EVENT.unpack_from(self.mm, self.events_at + (e_off + k) * EVENT.size) for k in range(e_cnt)]
+        return bpm, num, den, chars, events
+
+    def close(self): self.mm.close()
+
+def load_chart(tja_path, course="Oni", cache_dir=CHART_CACHE_DIR):
+    """ChartIndex for a TJA file, re-parsing only when the file or course changed."""
+    st = os.stat(tja_path)
+    key = f"{os.path.abspath(tja_path)}|{st.st_mtime_ns}|{st.st_size}|{course}|{INDEX_VERSION}"
+    index_path = os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".idx")
+    if not os.path.exists(index_path): build_index(tja_path, index_path, course)
+    return ChartIndex(index_path)
+
+def chart_title(tja_path):
+    """TITLE: header of a chart, read up to the first #START only."""
+    try:
+        with open(tja_path, 'r', encoding="utf-8-sig", errors="replace") as f:
+            for token in tokenize(f):
+                if token[0] == "header" and token[1] == "TITLE" and token[2]: return token[2]
+                if token[0] == "command" and token[1] == "START": break
+    except OSError: pass
+    return os.path.splitext(os.path.basename(tja_path))[0]
+
+def find_charts(directory=CHART_DIR):
+    try: return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.lower().endswith(".tja"))
+    except OSError: return []
+
+class ChartTimeline:
+    """
+    Walks a ChartIndex one measure at a time for the engine. Measures [first, last)
+    are drilled in a loop; BPMs are scaled by `tempo_scale` so the BPM slider
+    speeds up or slows down the whole chart.
+    """
+    def __init__(self, index, first=0, last=None, loop=True):
+        self.index = index
+        self.first = max(0, min(first, len(index) - 1)) if len(index) else 0
+        self.last = len(index) if last is None else max(self.first + 1, min(last, len(index)))
+        self.loop = loop
+        self.cursor = self.first
+        # Tempo of the drilled section's first measure; the engine scales relative to it
+        self.base_bpm = index.measure(self.first)[0] if len(index) else index.initial_bpm
+
+    def rewind(self): self.cursor = self.first
+
+    def next_measure(self, measure_start, tempo_scale=1.0):
+        """
+        Notes of the next measure as (time, type, step) starting at `measure_start`,
+        the measure's duration and its scaled tempo as [(time, BPM), ...], where a
+        0 BPM holds the beat through a delay (TempoMap.hold()) until the next entry.
+        Returns (None, 0, []) when a non-looping chart ends.
+        """
+        if self.cursor >= self.last:
+            if not self.loop or not len(self.index): return None, 0.0, []
+            self.cursor = self.first
+        bpm, num, den, chars, events = self.index.measure(self.cursor); self.cursor += 1
+        n = len(chars); ev = 0; t = measure_start; notes = []; tempo = [(t, bpm * tempo_scale)]
+        slots = max(1, n)
+        for slot in range(slots):
+            while ev < len(events) and events[ev][0] <= slot:
+                _, kind, value = events[ev]; ev += 1
+                if kind == EVENT_BPM: bpm = value
+                else: tempo.append((t, 0.0)); t += value / tempo_scale
+                tempo.append((t, bpm * tempo_scale))
+            if n:
+                lane = NOTE_LANES.get(chars[slot])
+                if lane: notes.append((t, lane, -1))
+            t += 240.0 / (bpm * tempo_scale) * num / den / slots
+        # Delays placed after the last note still push the next measure back
+        for _, kind, value in events[ev:]:
+            if kind == EVENT_DELAY: tempo.append((t, 0.0)); t += value / tempo_scale; tempo.append((t, bpm * tempo_scale))
+        return notes, t - measure_start, tempo
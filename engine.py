@@ -0,0 +1,289 @@
+import time
+import math
+from bisect import bisect_left
+from collections import deque
+from tempo import TempoMap
+
+# OFFICIAL ARCADE TIMING WINDOWS (in seconds)
+WINDOW_PERFECT = 0.025  # 25ms
+WINDOW_OK      = 0.075  # 75ms
+WINDOW_BAD     = 0.108  # 108ms
+
+# Judgment labels (lowercase form doubles as the stats key)
+JUDGE_GOOD, JUDGE_EARLY, JUDGE_LATE, JUDGE_BAD, JUDGE_MISS = "GOOD", "EARLY", "LATE", "BAD", "MISS"
+
+class Note:
+    """Compact note record."""
+    __slots__ = ("type", "time", "hit", "step", "beat")
+    def __init__(self, note_type, note_time, step=-1, beat=None):
+        self.type, self.time, self.hit, self.step, self.beat = note_type, note_time, False, step, beat
+
+class NoteLane:
+    """
+    Time-ordered note queue for a single lane (DON or KA).
+    Notes are appended in time order, so lookups are a binary search and
+    expired notes are consumed from the head in amortized O(1).
+    """
+    __slots__ = ("times", "notes", "head")
+    def __init__(self):
+        self.times = []; self.notes = []; self.head = 0
+
+    def __len__(self): return len(self.notes) - self.head
+
+    def push(self, note):
+        self.times.append(note.time); self.notes.append(note)
+
+    def clear(self):
+        self.times.clear(); self.notes.clear(); self.head = 0
+
+    def nearest(self, t, window):
+        """Closest unhit note within `window` seconds of `t`, or None."""
+        times, notes = self.times, self.notes
+        r = bisect_left(times, t, self.head); l = r - 1
+        best = None; best_diff = window
+        while l >= self.head and t - times[l] <= best_diff:
+            if not notes[l].hit: best = notes[l]; best_diff = t - times[l]; break
+            l -= 1
+        while r < len(times) and times[r] - t <= best_diff:
+            if not notes[r].hit:
+                # Ties go to the earlier note
+                if best is None or times[r] - t < best_diff: best = notes[r]
+                break
+            r += 1
+        return best
+
+    def pop_expired(self, cutoff):
+        """Remove and return notes older than `cutoff` from the head of the queue."""
+        times, start = self.times, self.head
+        end = start
+        while end < len(times) and times[end] < cutoff: end += 1
+        if end == start: return ()
+        expired = self.notes[start:end]; self.head = end
+        # Compact once the consumed prefix dominates the buffer
+        if end > 64 and end * 2 > len(times):
+            del self.times[:end]; del self.notes[:end]; self.head = 0
+        return expired
+
+    def retime(self, after, time_at):
+        """Re-place beat-anchored notes later than `after` on a changed tempo map (order is preserved)."""
+        times, notes = self.times, self.notes
+        for i in range(bisect_left(times, after, self.head), len(times)):
+            if notes[i].beat is not None: notes[i].time = times[i] = time_at(notes[i].beat)
+
+    def pending(self):
+        return self.notes[self.head:]
+
+    def window(self, t_from, t_to):
+        """Notes with t_from <= time < t_to, by index slicing."""
+        lo = bisect_left(self.times, t_from, self.head)
+        return self.notes[lo:bisect_left(self.times, t_to, lo)]
+
+def compile_pattern(pattern, loop_beat, time_at):
+    """Expand one loop of a step pattern into absolute (time, type, step, beat) note events."""
+    return [(time_at(loop_beat + i / 4), 'DON' if v == 1 else 'KA', i, loop_beat + i / 4) for i, v in enumerate(pattern) if v > 0]
+
+class TrainerEngine:
+    """
+    Headless simulation core: beat clock, note scheduling, judgment, combo and stats.
+    Has no pygame dependency. Time comes from an injectable clock so it can be
+    driven faster than realtime (benchmarks, replays) or by the live frame loop.
+    """
+    def __init__(self, clock=time.perf_counter, pattern_source=None, slots=32):
+        self.clock = clock
+        # Called once per compiled loop, so it decides the pattern for exactly that loop
+        self.pattern_source = pattern_source or (lambda: [0] * slots)
+        self.slots = slots
+        self.bpm = 100; self.offset = 0.0
+        self.game_mode = True; self.auto_play = False
+        self.lookahead_time = 0.0  # Seconds of lane visible ahead of the hit line (compile horizon)
+        self.running = False
+        # Callbacks: on_beat(beat_idx), on_loop(), on_judge(judgment, note_type, hit_time, error, is_auto)
+        self.on_beat = None; self.on_loop = None; self.on_judge = None
+        self.hit_log = None  # Optional HitLogWriter; every player judgment is appended to it
+        self.recorder = None  # Optional InputRecorder; inputs, state changes and compiled loops go to it
+        self.step_stats = None  # Optional accuracy.StepStats; player judgments update it per slot
+        self.windows = (WINDOW_PERFECT, WINDOW_OK, WINDOW_BAD)  # Overridable for re-scoring
+        self.auto_compile = True  # Replays push the recorded loops themselves
+        self.chart = None  # Optional chart.ChartTimeline; replaces the pattern loop with chart measures
+        self.speed_trainer = None  # Optional tempo.SpeedTrainer; ramps the BPM after clean loops
+        self.on_ramp = None  # on_ramp(bpm): the engine changed its own BPM (speed trainer)
+        self.stats = {"good": 0, "early": 0, "late": 0, "bad": 0, "miss": 0}
+        self.reset()
+
+    def reset(self, delay_sec=0, now=None):
+        """Clear notes, counters and stats and re-anchor the beat clock."""
+        now = self.clock() if now is None else now
+        self.start_time = now + delay_sec
+        self.session_start = now
+        self.beat_count = 0; self.seq_idx = -1
+        self.tempo = TempoMap(self.start_time, self.bpm); self.chart_tempo = False
+        self.next_loop = 0; self.next_loop_beat = 0.0; self.next_loop_time = self.start_time; self.lead_in = None
+        self.compiled = deque()  # (loop start beat, pattern) for loops not yet playing
+        self.playing_pattern = None  # Pattern of the loop under the playhead (game mode)
+        self.lanes = {"DON": NoteLane(), "KA": NoteLane()}
+        if self.chart: self.chart.rewind()
+        for k in self.stats: self.stats[k] = 0
+        self.combo = 0; self.max_combo = 0
+
+    def start(self, delay_sec=0, now=None):
+        self.reset(delay_sec, now); self.running = True
+        if self.hit_log: self.hit_log.begin_session(self.session_start, self.bpm)
+        if self.step_stats: self.step_stats.reset()
+        if self.speed_trainer: self.speed_trainer.reset()
+        if self.recorder: self.recorder.session(self)
+
+    def stop(self):
+        if self.running and self.recorder: self.recorder.record(self.recorder.last_tick, "stop")
+        self.running = False
+        if self.hit_log: self.hit_log.flush()
+
+    def clear_notes(self):
+        for lane in self.lanes.values(): lane.clear()
+
+    def _compile_next_loop(self, now):
+        """Append the next pattern loop (or chart measure), at the current BPM, to the lane timelines."""
+        if self.chart:
+            notes, duration, tempo = self.chart.next_measure(self.next_loop_time, self.bpm / self.chart.base_bpm)
+            # A finished non-looping chart parks the cursor at infinity
+            end = self.next_loop_time + duration if notes is not None else math.inf
+            if self.recorder:
+                rel = self.recorder.rel
+                self.recorder.record(now, "measure", [[(rel(t), note_type, step) for t, note_type, step in notes or []], rel(end), rel(self.lead_in), [(rel(t), bpm) for t, bpm in tempo]])
+            self.compile_measure(notes or [], end, self.lead_in, tempo); return
+        pattern = list(self.pattern_source())
+        if self.recorder: self.recorder.record(now, "loop", [self.next_loop_beat, pattern, self.recorder.rel(self.lead_in)])
+        self.compile_loop(self.next_loop_beat, pattern, self.lead_in)
+
+    def push_notes(self, notes, lead_in):
+        for note_time, note_type, step, beat in notes:
+            # Notes that would pop up mid-lane at session start are skipped
+            if note_time >= lead_in: self.lanes[note_type].push(Note(note_type, note_time, step, beat))
+
+    def compile_loop(self, loop_beat, pattern, lead_in):
+        self.compiled.append((loop_beat, pattern))
+        self.push_notes(compile_pattern(pattern, loop_beat, self.tempo.time_at), lead_in)
+        self.next_loop += 1; self.next_loop_beat = loop_beat + len(pattern) / 4
+        self.next_loop_time = self.tempo.time_at(self.next_loop_beat)
+
+    def compile_measure(self, notes, end_time, lead_in, tempo=()):
+        # Chart notes are placed in absolute time by the chart's own tempo (beat None);
+        # the tempo map follows that tempo so beats and metronome ticks line up with them
+        self.chart_tempo = True
+        for t, bpm in tempo:
+            if bpm <= 0: self.tempo.hold(t)
+            elif bpm != self.tempo.bpm_at(t): self.tempo.set_bpm(t, bpm)
+        self.push_notes([(t, note_type, step, None) for t, note_type, step in notes], lead_in)
+        self.next_loop += 1; self.next_loop_time = end_time
+
+    def sync_tempo(self, t):
+        """Start a new tempo segment at `t` if the BPM was changed from outside."""
+        # Under a chart the BPM only scales the measures still to be compiled
+        if self.chart_tempo or self.bpm == self.tempo.target: return
+        self.tempo.set_bpm(t, self.bpm); self._retime(t)
+
+    def ramp_to(self, t, bpm, duration):
+        """Ramp the tempo linearly from its value at `t` to `bpm` over `duration` seconds."""
+        if not self.chart_tempo: self.tempo.ramp(t, bpm, duration)
+        self.bpm = bpm; self._retime(t)
+        if self.recorder: self.recorder.record(t, "ramp", [bpm, duration]); self.recorder.state["bpm"] = bpm
+        if self.on_ramp: self.on_ramp(bpm)
+
+    def _retime(self, t):
+        for lane in self.lanes.values(): lane.retime(t, self.tempo.time_at)
+        if not self.chart: self.next_loop_time = self.tempo.time_at(self.next_loop_beat)
+
+    @property
+    def beat_interval(self): return 60.0 / self.bpm
+
+    def _judge(self, judgment, note, hit_time, error, is_auto):
+        self.stats[judgment.lower()] += 1
+        if self.hit_log and not is_auto: self.hit_log.log(hit_time, note.type, error, judgment, note.step, self.bpm)
+        if self.step_stats and not is_auto: self.step_stats.add(note.type, note.step, error)
+        if self.speed_trainer: self.speed_trainer.judged(judgment, is_auto)
+        if judgment in (JUDGE_BAD, JUDGE_MISS): self.combo = 0
+        else: self.combo += 1
+        self.max_combo = max(self.combo, self.max_combo)
+        if self.on_judge: self.on_judge(judgment, note.type, hit_time, error, is_auto)
+
+    def feed_input(self, input_type, timestamp, is_auto=False):
+        """Judge a 'DON'/'KA' press at `timestamp`. Returns the judgment label or None."""
+        if not (self.running and self.game_mode): return None
+        if self.recorder and not is_auto:
+            self.recorder.track(timestamp, self); self.recorder.record(timestamp, "hit", [input_type, self.recorder.rel(self.recorder.last_tick)])
+        if not is_auto: self.sync_tempo(timestamp)
+        w_perfect, w_ok, w_bad = self.windows
+        adj_hit = timestamp - self.offset
+        best_note = self.lanes[input_type].nearest(adj_hit, w_perfect if is_auto else w_bad)
+        if best_note is None: return None
+        best_note.hit = True
+        real_diff = best_note.time - adj_hit; min_diff = abs(real_diff)
+        if min_diff <= w_perfect or is_auto: judgment = JUDGE_GOOD
+        elif min_diff <= w_ok: judgment = JUDGE_LATE if real_diff < 0 else JUDGE_EARLY
+        else: judgment = JUDGE_BAD
+        self._judge(judgment, best_note, timestamp, -real_diff, is_auto)
+        return judgment
+
+    def advance(self, to_time):
+        """Step the simulation to `to_time`: beat ticks, note spawning, autoplay and miss sweeping."""
+        if not self.running: return
+        if self.recorder: self.recorder.track(to_time, self); self.recorder.last_tick = to_time
+        self.sync_tempo(to_time)
+        beat_pos = self.tempo.beat_at(to_time)
+
+        if beat_pos >= 0:
+            beat = int(beat_pos)
+            if beat > self.beat_count:
+                self.beat_count = beat
+                if self.on_beat: self.on_beat(beat)
+            new_idx = int(beat_pos * 4) % self.slots
+
+            # Robust loop detection (drives auto-randomize in the front end)
+            if new_idx == 0 and self.seq_idx == self.slots - 1:
+                # Half a step of slack absorbs rounding at the loop boundary
+                while self.compiled and self.compiled[0][0] <= beat_pos + 0.125:
+                    self.playing_pattern = self.compiled.popleft()[1]
+                if self.speed_trainer: self.speed_trainer.loop_done(self, to_time)
+                if self.on_loop: self.on_loop()
+                # Segments from long ago are no longer needed for lookups
+                if len(self.tempo.times) > 64: self.tempo.prune(to_time - 60.0)
+
+            self.seq_idx = new_idx
+
+        if not self.game_mode: return
+        # Compile whole loops as soon as the visible horizon reaches them, so no
+        # note can be skipped or duplicated regardless of frame timing or scroll speed
+        horizon = to_time + self.lookahead_time
+        if self.lead_in is None: self.lead_in = max(self.start_time, horizon)
+        while self.auto_compile and self.next_loop_time <= horizon: self._compile_next_loop(to_time)
+        if self.auto_play:
+            due = to_time - self.offset
+            for lane in self.lanes.values():
+                i = lane.head
+                while i < len(lane.times) and lane.times[i] <= due:
+                    if not lane.notes[i].hit: self.feed_input(lane.notes[i].type, to_time, is_auto=True)
+                    i += 1
+
+        # Expired notes leave the queue; the unhit ones count as misses
+        cutoff = to_time - self.windows[2]
+        for lane in self.lanes.values():
+            for m in lane.pop_expired(cutoff):
+                if not m.hit: self._judge(JUDGE_MISS, m, to_time, None, False)
+
+    def audio_events(self, t_from, t_to):
+        """(sound name, absolute time) for metronome ticks and autoplay hits due in [t_from, t_to)."""
+        if not self.running: return []
+        # Beat 0 is silent, matching on_beat which first fires on beat 1
+        time_at = self.tempo.time_at
+        k = max(1, int(math.ceil(self.tempo.beat_at(t_from))))
+        events = []
+        while time_at(k) < t_to:
+            events.append(("metro_tick", time_at(k))); k += 1
+        if self.game_mode and self.auto_play:
+            for note_type, lane in self.lanes.items():
+                name = "don" if note_type == 'DON' else "ka"
+                events.extend((name, n.time + self.offset) for n in lane.window(t_from - self.offset, t_to - self.offset))
+        return events
+
+    def visible_notes(self, t_from, t_to):
+        """Unhit notes timed within [t_from, t_to), for the renderer."""
+        return [n for lane in self.lanes.values() for n in lane.window(t_from, t_to) if not n.hit]
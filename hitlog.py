@@ -0,0 +1,117 @@
+import os
+import time
+import mmap
+import queue
+import struct
+import threading
+from array import array
+
+HIT_LOG_FILE = "hit_log.bin"
+MAGIC = b"UBHL\x01\x00\x00\x00"
+
+# One 20-byte record per judged note: seconds since session start, signed error
+# in microseconds, BPM, lane, judgment code, step index (NO_STEP for chart notes), padding
+RECORD = struct.Struct("<difBBBx")
+LANES = ("DON", "KA")
+JUDGMENTS = ("GOOD", "EARLY", "LATE", "BAD", "MISS")
+SESSION = 255         # Judgment code of a session marker; its timestamp is wall-clock time
+NO_ERROR = -2**31     # error_us of a miss (the note was never hit)
+NO_STEP = 255         # Step index of a note that isn't on the sequencer (charts)
+
+class HitLogWriter:
+    """
+    Append-only hit log. Records are packed into fixed-size blocks and handed to a
+    background writer thread; blocks come back to a small free pool afterwards, so
+    memory stays constant for any session length and log() never touches the disk.
+    If the disk falls behind and the pool runs dry, blocks are dropped and counted.
+    """
+    def __init__(self, path=HIT_LOG_FILE, block_records=512, pool=8):
+        self.path = path
+        self.block_size = block_records * RECORD.size
+        self.free = queue.Queue()
+        for _ in range(pool): self.free.put(bytearray(self.block_size))
+        self.full = queue.Queue()
+        self.block = self.free.get(); self.used = 0
+        self.dropped = 0; self.records = 0
+        self.session_start = 0.0
+        self.running = True
+        self.thread = threading.Thread(target=self._writer, daemon=True); self.thread.start()
+
+    def begin_session(self, now, bpm):
+        """Write a session marker; later timestamps are relative to `now`."""
+        self.session_start = now
+        self._append(time.time(), 0, bpm, 0, SESSION, 0)
+
+    def log(self, hit_time, lane, error, judgment, step, bpm):
+        """Record one judgment. `error` is in seconds (None for a miss), `lane`/`judgment` are labels."""
+        error_us = NO_ERROR if error is None else int(round(error * 1e6))
+        self._append(hit_time - self.session_start, error_us, bpm, LANES.index(lane), JUDGMENTS.index(judgment), NO_STEP if step < 0 else step)
+
+    def _append(self, t, error_us, bpm, lane, judgment, step):
+        if self.block is None:
+            try: self.block = self.free.get_nowait(); self.used = 0
+            except queue.Empty: self.dropped += 1; return
+        RECORD.pack_into(self.block, self.used, t, error_us, bpm, lane, judgment, step)
+        self.used += RECORD.size; self.records += 1
+        if self.used == self.block_size: self.flush()
+
+    def flush(self):
+        """Hand the current (possibly partial) block to the writer thread."""
+        if self.block is None or not self.used: return
+        self.full.put((self.block, self.used)); self.block = None
+        try: self.block = self.free.get_nowait(); self.used = 0
+        except queue.Empty: pass
+
+    def _writer(self):
+        try:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            f = open(self.path, 'ab')
+            if new: f.write(MAGIC)
+        except OSError: f = None
+        while True:
+            item = self.full.get()
+            if item is None: break
+            block, n = item
+            if f:
+                try: f.write(memoryview(block)[:n]); f.flush()
+                except OSError: pass
+            self.free.put(block)
+        if f: f.close()
+
+    def close(self):
+        if not self.running: return
+        self.running = False
+        self.flush(); self.full.put(None); self.thread.join(timeout=1.0)
+
+class HitLogReader:
+    """Memory-mapped, read-only view of a hit log. Records are decoded on access."""
+    def __init__(self, path=HIT_LOG_FILE):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC: raise ValueError(f"{path} is not a hit log")
+        body = len(self.mm) - len(MAGIC)
+        # A record cut short by a crash is ignored
+        self.view = memoryview(self.mm)[len(MAGIC):len(MAGIC) + body - body % RECORD.size]
+
+    def __len__(self): return len(self.view) // RECORD.size
+
+    def __getitem__(self, i):
+        if i < 0: i += len(self)
+        return RECORD.unpack_from(self.view, i * RECORD.size)
+
+    def __iter__(self): return RECORD.iter_unpack(self.view)
+
+    def sessions(self):
+        """[(wall-clock start, [records...])] split at session markers."""
+        result = []
+        for rec in self:
+            if rec[4] == SESSION: result.append((rec[0], []))
+            elif result: result[-1][1].append(rec)
+        return result
+
+    def errors_us(self, lane=None):
+        """Signed timing errors of every hit (misses excluded) as array('i')."""
+        return array('i', (r[1] for r in self if r[4] != SESSION and r[1] != NO_ERROR and (lane is None or r[3] == LANES.index(lane))))
+
+    def close(self):
+        self.view.release(); self.mm.close()
@@ -0,0 +1,253 @@
+import pygame
+import time
+import threading
+from collections import deque
+try: from pygame.midi import MidiException
+except ImportError: MidiException = OSError  # pygame built without PortMidi
+
+class InputStamper:
+    """
+    Stamps every SDL event with perf_counter() at the moment it is pulled off the
+    queue. Polled from each simulation tick, i.e. at a high rate between frames.
+    Judgment then uses the stamp instead of the frame's start time, so timing error
+    is bounded by the poll interval rather than the frame period plus render time.
+    """
+    def __init__(self, clock=time.perf_counter, history=256):
+        self.clock = clock
+        self.pending = deque()
+        self.last_poll = clock()
+        # Stamping uncertainty per event: the event arrived somewhere within the
+        # gap between the previous poll and the one that picked it up
+        self.gaps = deque(maxlen=history); self.gap_sum = 0.0
+
+    def poll(self):
+        """Pull everything SDL has queued and stamp it with the current time."""
+        events = pygame.event.get()
+        now = self.clock()
+        if events:
+            gap = now - self.last_poll
+            for event in events:
+                self.pending.append((now, event))
+                if event.type == pygame.KEYDOWN:
+                    if len(self.gaps) == self.gaps.maxlen: self.gap_sum -= self.gaps[0]
+                    self.gaps.append(gap); self.gap_sum += gap
+        self.last_poll = now
+
+    def drain(self):
+        """Return and clear all (stamp, event) pairs collected since the last drain."""
+        self.poll()
+        items = list(self.pending); self.pending.clear()
+        return items
+
+    @property
+    def jitter(self):
+        """Mean stamping uncertainty (seconds) over recent key presses."""
+        return self.gap_sum / len(self.gaps) if self.gaps else 0.0
+
+    @property
+    def worst_jitter(self):
+        return max(self.gaps) if self.gaps else 0.0
+
+# --- DRUM CONTROLLERS ---
+# Bind codes: "joy:button:<n>", "joy:axis:<n>+/-", "joy:hat:<n>:<x>,<y>" for any
+# joystick, "midi:<note>" for any MIDI input. Bind ids are the keyboard ones.
+BIND_LANES = {"don_l": "DON", "don_r": "DON", "ka_l": "KA", "ka_r": "KA"}
+AXIS_THRESHOLD = 0.5
+JOY_EVENTS = (pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP, pygame.JOYAXISMOTION, pygame.JOYHATMOTION, pygame.JOYDEVICEADDED, pygame.JOYDEVICEREMOVED)
+
+def bind_label(code):
+    """Short label for a bind button, e.g. 'B3', 'A2+', 'N38'."""
+    if not code: return ""
+    kind = code.split(":")
+    if kind[0] == "midi": return f"N{kind[1]}"
+    return {"button": "B", "axis": "A", "hat": "H"}.get(kind[1], "?") + ":".join(kind[2:])
+
+class ClockSync:
+    """
+    Maps a device clock (milliseconds, e.g. PortMidi's) onto perf_counter(). The
+    offset is taken from the tightest of a few back-to-back readings, and redone
+    every `interval` seconds so slow drift between the clocks is followed.
+    """
+    def __init__(self, device_time, clock=time.perf_counter, samples=8, interval=5.0):
+        self.device_time, self.clock = device_time, clock
+        self.samples, self.interval = samples, interval
+        self.offset = 0.0; self.synced_at = None
+        self.sync()
+
+    def sync(self):
+        best = None
+        for _ in range(self.samples):
+            t0 = self.clock(); d = self.device_time(); t1 = self.clock()
+            if best is None or t1 - t0 < best[0]: best = (t1 - t0, (t0 + t1) / 2 - d / 1000.0)
+        self.offset = best[1]; self.synced_at = self.clock()
+
+    def maybe_sync(self):
+        if self.clock() - self.synced_at >= self.interval: self.sync()
+
+    def to_local(self, device_ms): return device_ms / 1000.0 + self.offset
+
+class MidiPoller:
+    """
+    Polls one MIDI input on its own thread. Note-ons at or above `min_velocity` are
+    converted to (stamp, code, device, velocity) with the device timestamp moved
+    into the perf_counter domain, and queued for the simulation tick to drain.
+    `source` needs poll()/read(n) like pygame.midi.Input; `device_time` returns
+    the source's clock in ms.
+    """
+    def __init__(self, source, name, device_time, min_velocity=1, clock=time.perf_counter, poll_interval=0.0005):
+        self.source, self.name = source, name
+        self.sync = ClockSync(device_time, clock)
+        self.min_velocity = min_velocity
+        self.poll_interval = poll_interval
+        self.events = deque()
+        self.running = False; self.thread = None
+        self.error = None  # Why the device was lost, once polling has stopped on an error
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True); self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread: self.thread.join(timeout=0.5)
+
+    def _run(self):
+        while self.running:
+            try:
+                if self.source.poll():
+                    for (status, note, velocity, _), device_ms in self.source.read(64):
+                        if status & 0xF0 == 0x90 and velocity >= self.min_velocity:
+                            self.events.append((self.sync.to_local(device_ms), f"midi:{note}", self.name, velocity))
+                else: self.sync.maybe_sync()
+            except (OSError, RuntimeError, MidiException) as e:
+                # Unplugged or closed under us: stop polling and say so instead of going quiet
+                self.error = e; self.running = False
+                print(f"[input] MIDI device '{self.name}' lost ({e})"); break
+            time.sleep(self.poll_interval)
+
+class VirtualMidiInput:
+    """
+    Software stand-in for a MIDI drum: inject() queues a note-on stamped on its own
+    millisecond clock (deliberately offset from perf_counter) and read() hands it
+    out once that time has come, the way PortMidi does.
+    """
+    def __init__(self, clock=time.perf_counter, offset_ms=123456.0):
+        self.clock, self.offset_ms = clock, offset_ms
+        self.queue = deque(); self.lock = threading.Lock()
+
+    def time(self): return int(self.clock() * 1000 + self.offset_ms)
+
+    def inject(self, note, velocity=100, at_time=None):
+        """Note-on at perf_counter time `at_time` (default: now)."""
+        at = self.clock() if at_time is None else at_time
+        with self.lock: self.queue.append([[0x90, note, velocity, 0], int(at * 1000 + self.offset_ms)])
+
+    def poll(self):
+        with self.lock: return bool(self.queue) and self.queue[0][1] <= self.time()
+
+    def read(self, n):
+        now = self.time(); out = []
+        with self.lock:
+            while self.queue and len(out) < n and self.queue[0][1] <= now: out.append(self.queue.popleft())
+        return out
+
+class LatencyMeter:
+    """
+    Input-to-judgment latency per device over its last `history` hits (seconds).
+    The window's sum and worst value are kept up to date in add(), so reading them
+    costs nothing per hit.
+    """
+    def __init__(self, history=128):
+        self.history = history; self.samples = {}
+        self.totals = {}; self.peaks = {}; self.counts = {}
+
+    def add(self, device, latency):
+        samples = self.samples.setdefault(device, deque(maxlen=self.history))
+        total = self.totals.get(device, 0.0)
+        if len(samples) == self.history: total -= samples[0]
+        samples.append(latency); self.totals[device] = total + latency
+        # Window maximum: (hit number, latency) pairs with decreasing latency
+        n = self.counts[device] = self.counts.get(device, 0) + 1
+        peaks = self.peaks.setdefault(device, deque())
+        while peaks and peaks[-1][1] <= latency: peaks.pop()
+        peaks.append((n, latency))
+        if peaks[0][0] <= n - self.history: peaks.popleft()
+
+    def summary(self):
+        """{device: (mean, worst)}"""
+        return {d: (self.totals[d] / len(s), self.peaks[d][0][1]) for d, s in self.samples.items() if s}
+
+class ControllerInput:
+    """
+    Drum controllers besides the keyboard. Joystick events arrive through SDL
+    (already stamped by InputStamper) and are turned into bind codes here; MIDI
+    inputs each get a MidiPoller thread. `binds` maps bind id -> code, like the
+    keyboard binds.
+    """
+    def __init__(self, binds, min_velocity=1, clock=time.perf_counter):
+        self.binds = binds; self.min_velocity = min_velocity; self.clock = clock
+        self.joysticks = {}; self.axes = {}
+        self.pollers = []
+        self.latency = LatencyMeter()
+
+    def lane(self, code):
+        """'DON'/'KA' for a bound code, else None."""
+        for bind_id, bound in self.binds.items():
+            if bound == code: return BIND_LANES[bind_id]
+        return None
+
+    def open_joysticks(self):
+        """Start the joystick subsystem (not done by the staged startup) and open every pad."""
+        try:
+            pygame.joystick.init()
+            for i in range(pygame.joystick.get_count()): self._add_joystick(i)
+        except pygame.error: pass
+
+    def _add_joystick(self, index):
+        js = pygame.joystick.Joystick(index); self.joysticks[js.get_instance_id()] = js
+
+    def open_midi(self):
+        """Open every MIDI input through PortMidi; silently skipped when it is unavailable."""
+        try:
+            import pygame.midi
+            pygame.midi.init()
+            for i in range(pygame.midi.get_count()):
+                _, name, is_input, _, opened = pygame.midi.get_device_info(i)
+                if is_input and not opened: self.add_midi(pygame.midi.Input(i), name.decode(errors="replace"), pygame.midi.time)
+        except: pass
+
+    def add_midi(self, source, name, device_time):
+        poller = MidiPoller(source, name, device_time, self.min_velocity, self.clock)
+        poller.start(); self.pollers.append(poller)
+        return poller
+
+    def device_name(self, event):
+        js = self.joysticks.get(getattr(event, "instance_id", None))
+        return js.get_name() if js else "joystick"
+
+    def joystick_code(self, event):
+        """Bind code for a joystick press/edge event, or None (also tracks hot-plugging)."""
+        if event.type == pygame.JOYDEVICEADDED:
+            try: self._add_joystick(event.device_index)
+            except pygame.error: pass
+        elif event.type == pygame.JOYDEVICEREMOVED: self.joysticks.pop(event.instance_id, None)
+        elif event.type == pygame.JOYBUTTONDOWN: return f"joy:button:{event.button}"
+        elif event.type == pygame.JOYHATMOTION and event.value != (0, 0): return f"joy:hat:{event.hat}:{event.value[0]},{event.value[1]}"
+        elif event.type == pygame.JOYAXISMOTION:
+            # Drum pads on an axis fire once per crossing of the threshold, not on every motion report
+            key = (event.instance_id, event.axis)
+            side = 1 if event.value > AXIS_THRESHOLD else (-1 if event.value < -AXIS_THRESHOLD else 0)
+            prev = self.axes.get(key, 0); self.axes[key] = side
+            if side and side != prev: return f"joy:axis:{event.axis}{'+' if side > 0 else '-'}"
+        return None
+
+    def drain_midi(self):
+        """(stamp, code, device, velocity) of every MIDI hit since the last call, in stamp order."""
+        hits = []
+        for poller in self.pollers:
+            while poller.events: hits.append(poller.events.popleft())
+        hits.sort(key=lambda h: h[0])
+        return hits
+
+    def stop(self):
+        for poller in self.pollers: poller.stop()
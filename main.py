@@ -1,12 +1,26 @@
+import time
+STARTUP_T0 = time.perf_counter()  # --startup-trace times are measured from here
 import pygame
 import sys
-import time
+import threading
 import json
 import os
 import random
 import math
-from audio import AudioManager
-from ui import Button, Checkbox, JudgmentText, init_font, Slider, Dropdown
+from audio import AudioManager, calibrate
+from ui import Button, Checkbox, JudgmentText, init_font, Slider, Dropdown, WidgetTree, render_text, text_cache, get_font, font_registry
+from sprites import SpriteAtlas, GLOW_DURATION, FLASH_DURATION
+from render import SurfaceCanvas, TextureCanvas
+from inputs import InputStamper, ControllerInput, JOY_EVENTS, bind_label
+from profiler import FrameProfiler, StartupTrace, PHASES
+from pacing import FramePacer
+from patterns import PatternGenerator
+from hitlog import HitLogWriter
+from replay import InputRecorder
+from accuracy import StepStats, DriftEstimator
+from chart import load_chart, find_charts, chart_title, ChartTimeline
+from tempo import SpeedTrainer
+from engine import TrainerEngine, WINDOW_PERFECT, WINDOW_OK, WINDOW_BAD, JUDGE_GOOD, JUDGE_EARLY, JUDGE_LATE, JUDGE_BAD, JUDGE_MISS
 
 # --- PYINSTALLER PATH FIX ---
 def resource_path(relative_path):
@@ -21,11 +35,6 @@ def resource_path(relative_path):
 # --- GLOBAL CONSTANTS ---
 CONFIG_FILE = "settings.json"
 
-# OFFICIAL ARCADE TIMING WINDOWS (in seconds)
-WINDOW_PERFECT = 0.025  # 25ms
-WINDOW_OK      = 0.075  # 75ms
-WINDOW_BAD     = 0.108  # 108ms
-
 # UI and Visual Colors
 COLOR_BG = (20, 20, 20)
 COLOR_BAR = (10, 10, 10)
@@ -42,6 +51,15 @@ COL_JUDGE_LATE    = (255, 80, 80)
 COL_JUDGE_BAD     = (180, 80, 255) 
 COL_JUDGE_MISS    = (120, 120, 120)
 
+# Judgment -> (feedback text, color)
+JUDGE_STYLES = {
+    JUDGE_GOOD: ("GOOD!", COL_JUDGE_PERFECT), JUDGE_EARLY: ("EARLY", COL_JUDGE_EARLY),
+    JUDGE_LATE: ("LATE", COL_JUDGE_LATE), JUDGE_BAD: ("BAD", COL_JUDGE_BAD), JUDGE_MISS: ("MISS", COL_JUDGE_MISS),
+}
+
+# How far ahead (seconds) metronome ticks and demo hits are handed to the audio stream
+AUDIO_LEAD = 0.1
+
 # Scroll Speed Options (Multipliers)
 SPEED_OPTIONS = [
     {"name": "Speed: 1.0x", "val": 1.0},
@@ -70,6 +88,12 @@ PRESETS = [
     {"name": "Ka 1/16 Stream [○○○○]", "data": [2] * 32},
 ]
 
+def heat_color(mean_error):
+    """Yellow when on time, fading to the EARLY blue / LATE red as the mean error nears WINDOW_OK."""
+    t = max(-1.0, min(1.0, mean_error / WINDOW_OK))
+    target = COL_JUDGE_EARLY if t < 0 else COL_JUDGE_LATE; t = abs(t)
+    return tuple(int(a + (b - a) * t) for a, b in zip(COL_JUDGE_PERFECT, target))
+
 class PatternSequencer:
     """Handles the 32-step pattern grid logic and rendering."""
     def __init__(self, x, y, width, slots=32):
@@ -84,16 +108,17 @@ class PatternSequencer:
         raw_size = (self.width - ((self.slots - 1) * self.spacing)) / self.slots
         self.box_size = max(15, min(40, raw_size))
 
+    def hit_rect(self):
+        return pygame.Rect(self.x, self.y, (self.box_size + self.spacing) * self.slots + 1, self.box_size + 1)
+
+    def slot_at(self, pos):
+        """Slot index under `pos`, or -1."""
+        if not self.hit_rect().collidepoint(pos): return -1
+        slot = int((pos[0] - self.x) // (self.box_size + self.spacing))
+        return slot if slot < self.slots else -1
+
     def handle_event(self, event):
-        if event.type == pygame.MOUSEMOTION:
-            mx, my = event.pos
-            rel_x = mx - self.x
-            total_w = (self.box_size + self.spacing) * self.slots
-            if 0 <= (my - self.y) <= self.box_size and 0 <= rel_x <= total_w:
-                self.hovered_slot = int(rel_x // (self.box_size + self.spacing))
-                if self.hovered_slot >= self.slots: self.hovered_slot = -1
-            else:
-                self.hovered_slot = -1
+        if event.type == pygame.MOUSEMOTION: self.hovered_slot = self.slot_at(event.pos)
         
         if event.type == pygame.MOUSEBUTTONDOWN:
             if self.hovered_slot != -1 and 0 <= self.hovered_slot < self.slots:
@@ -101,10 +126,12 @@ class PatternSequencer:
                 return True
         return False
 
-    def draw(self, screen, current_step_idx=-1):
+    def draw(self, screen, current_step_idx=-1, heat=None, origin=(0, 0)):
+        """`heat` (accuracy.StepStats) overlays each slot's mean error, spread and miss rate; `origin` is where `screen` sits on the window."""
+        x0, y = self.x - origin[0], self.y - origin[1]
         for i in range(self.slots):
-            bx = self.x + i * (self.box_size + self.spacing)
-            rect = pygame.Rect(bx, self.y, self.box_size, self.box_size)
+            bx = x0 + i * (self.box_size + self.spacing)
+            rect = pygame.Rect(bx, y, self.box_size, self.box_size)
             val = self.pattern[i]
             col = COLOR_EMPTY_SLOT
             if val == 1: col = COLOR_DON
@@ -112,10 +139,25 @@ class PatternSequencer:
             if i == current_step_idx: pygame.draw.rect(screen, (255, 255, 0), rect.inflate(4, 4), 2)
             pygame.draw.rect(screen, col, rect, border_radius=3)
             pygame.draw.rect(screen, (100, 100, 100), rect, 1, border_radius=3)
+            if heat and val: self.draw_heat(screen, rect, heat.cell('DON' if val == 1 else 'KA', i))
             if i > 0 and i % 16 == 0:
                 sep_x = bx - (self.spacing / 2)
-                pygame.draw.line(screen, (255, 255, 255), (sep_x, self.y - 10), (sep_x, self.y + self.box_size + 10), 2)
-            elif i % 4 == 0: pygame.draw.circle(screen, (150, 150, 150), (bx + self.box_size/2, self.y - 6), 2)
+                pygame.draw.line(screen, (255, 255, 255), (sep_x, y - 10), (sep_x, y + self.box_size + 10), 2)
+            elif i % 4 == 0: pygame.draw.circle(screen, (150, 150, 150), (bx + self.box_size/2, y - 6), 2)
+
+    def draw_heat(self, screen, rect, cell):
+        hits, mean, std, miss_rate = cell
+        half = rect.h // 2
+        if hits:
+            # Lower half: mean error as colour, spread as a dark bar growing from the left
+            lower = pygame.Rect(rect.x + 2, rect.y + half, rect.w - 4, rect.h - half - 2)
+            pygame.draw.rect(screen, COLOR_BAR, lower.inflate(0, 2).move(0, -1))
+            pygame.draw.rect(screen, heat_color(mean), lower.inflate(-2, -2))
+            spread = int(min(1.0, std / WINDOW_OK) * (lower.w - 2))
+            if spread: pygame.draw.rect(screen, COLOR_BAR, (lower.x + 1, lower.bottom - 4, spread, 3))
+        if miss_rate:
+            # Upper half darkens from the top with the miss rate
+            pygame.draw.rect(screen, COL_JUDGE_MISS, (rect.x + 2, rect.y + 2, rect.w - 4, max(2, int((half - 2) * miss_rate))))
 
     def clear(self): self.pattern = [0] * self.slots
     def randomize(self): self.pattern = [random.choice([0, 0, 1, 2]) for _ in range(self.slots)]
@@ -129,7 +171,10 @@ def load_settings():
     defaults = {
         "bpm": 100, "hs_multiplier": 1.0, "vol_don": 0.8, "vol_ka": 0.8, "vol_metro": 0.5, 
         "is_game_mode": False, "offset": 0.0, "scale_bpm": True,
-        "auto_randomize": False, "custom_pattern": [0] * 32,
+        "auto_randomize": False, "custom_pattern": [0] * 32, "dirty_rects": True,
+        "pacing_mode": "display", "render_fps_cap": 144, "sim_hz": 1000, "precise_sleep": False, "pattern_rules": {}, "hit_log": True, "record_inputs": True, "auto_offset": False, "chart_section": None,
+        "speed_trainer": {"enabled": False, "clean_loops": 4, "step": 5, "max_bpm": 400},
+        "pad_binds": {}, "midi_min_velocity": 10, "audio_frequency": 44100, "audio_buffer": 512, "render_backend": "software",
         "binds": {"don_l": pygame.K_f, "don_r": pygame.K_j, "ka_l": pygame.K_d, "ka_r": pygame.K_k}
     }
     if not os.path.exists(CONFIG_FILE): return defaults
@@ -158,58 +203,115 @@ def get_refresh_rate():
     except: pass
     return 240 # Increased default fallback to ensure high-end monitors aren't capped
 
+# Font families the UI uses; their files are resolved on the loader thread
+UI_FONTS = [("Arial", True), ("Consolas", True)]
+
+def show_splash(screen, loader, message="Loading", present=pygame.display.flip):
+    """Splash frame shown, and the window kept responsive, until the `loader` thread finishes."""
+    title = pygame.font.Font(None, 64).render("U.B. Taiko Pattern Trainer", True, (255, 255, 255))
+    small = pygame.font.Font(None, 28); t0 = time.perf_counter()
+    while True:
+        # Only QUIT is taken; input posted during loading stays queued for the main loop
+        if pygame.event.get(pygame.QUIT): pygame.quit(); sys.exit()
+        W, H = screen.get_size()
+        screen.fill(COLOR_BG)
+        screen.blit(title, title.get_rect(center=(W // 2, H // 2 - 30)))
+        status = small.render(message + "." * (1 + int((time.perf_counter() - t0) * 3) % 3), True, (150, 150, 150))
+        screen.blit(status, status.get_rect(center=(W // 2, H // 2 + 30)))
+        present()
+        if not loader.is_alive(): return
+        loader.join(1 / 30)
+
 def main():
-    pygame.init()
+    trace = StartupTrace(STARTUP_T0, "--startup-trace" in sys.argv)
+    # Staged startup: only the display and mixer come up eagerly (pygame.init() would
+    # also start joystick and other unused subsystems); fonts, sounds and the chart
+    # list load on a thread behind the splash frame
+    pygame.display.init()
     init_font()
     
+    settings = load_settings()
+    
     # --- LOAD CUSTOM ICON USING RESOURCE_PATH ---
-    icon_path = resource_path(os.path.join("assets", "icon.png"))
+    icon_path = resource_path(os.path.join("assets", "icon.png")); icon_img = None
     if os.path.exists(icon_path):
         try:
             icon_img = pygame.image.load(icon_path)
             pygame.display.set_icon(icon_img)
         except: pass
-            
-    font_ui = pygame.font.SysFont("Arial", 18, bold=True)
-    font_bpm = pygame.font.SysFont("Arial", 40, bold=True)
-    font_stats = pygame.font.SysFont("Consolas", 28, bold=True) 
-    font_combo = pygame.font.SysFont("Arial", 64, bold=True)
-    
+
     W, H = 1920, 1080
-    screen = pygame.display.set_mode((W, H), pygame.RESIZABLE)
-    pygame.display.set_caption("U.B. Taiko Pattern Trainer")
+    # Optional texture backend (pygame._sdl2 Renderer); falls back to the software path if it can't start
+    gpu = None
+    if settings["render_backend"] == "gpu" or "--gpu" in sys.argv:
+        try:
+            gpu = TextureCanvas("U.B. Taiko Pattern Trainer", (W, H))
+            if icon_img: gpu.window.set_icon(icon_img)
+        except Exception as e: print(f"[render] texture backend unavailable ({e}), using software"); gpu = None
+    if gpu:
+        # Software-drawn frames (splash) go through this surface and are presented as one texture
+        screen = pygame.Surface(gpu.get_size())
+        present = lambda: gpu.present_surface(screen)
+    else:
+        screen = pygame.display.set_mode((W, H), pygame.RESIZABLE)
+        pygame.display.set_caption("U.B. Taiko Pattern Trainer")
+        present = pygame.display.flip
+    trace.mark("display")
+    if "--calibrate-audio" in sys.argv:
+        # Probe smaller mixer buffers / other rates and keep the lowest stable one
+        def run_calibration():
+            settings["audio_frequency"], settings["audio_buffer"], reports = calibrate()
+            for r in reports: print(f"[audio] {r}")
+        calibration = threading.Thread(target=run_calibration, daemon=True); calibration.start()
+        show_splash(screen, calibration, "Calibrating audio", present)
+        save_settings(settings)
+    audio = AudioManager(load_sounds=False, frequency=settings["audio_frequency"], buffer=settings["audio_buffer"])
+    trace.mark("mixer")
+    # Joystick drums and MIDI e-kits, bound per bind id like the keyboard keys
+    controllers = ControllerInput(settings["pad_binds"], settings["midi_min_velocity"])
+
+    chart_presets = []
+    def load_assets():
+        font_registry.preload(UI_FONTS)
+        audio.load_sounds()
+        controllers.open_midi()
+        chart_presets.extend({"name": f"Chart: {chart_title(path)}", "chart": path} for path in find_charts())
+    loader = threading.Thread(target=load_assets, daemon=True); loader.start()
+    show_splash(screen, loader, present=present)
+    trace.mark("assets")
+    controllers.open_joysticks()
+
+    font_ui = get_font("Arial", 18, bold=True)
+    font_bpm = get_font("Arial", 40, bold=True)
+    font_stats = get_font("Consolas", 28, bold=True) 
+    font_combo = get_font("Arial", 64, bold=True)
+    font_prof = get_font("Consolas", 16, bold=True)
     
     refresh_rate = get_refresh_rate()
-    target_fps = max(60, refresh_rate) 
     clock = pygame.time.Clock()
-    audio = AudioManager()
-    settings = load_settings()
+    stamper = InputStamper()
+    profiler = FrameProfiler()
+    prof_lines = []; last_prof_update = 0
+    pacer = FramePacer(refresh_rate, settings["pacing_mode"], settings["render_fps_cap"], settings["sim_hz"], settings["precise_sleep"])
+    target_fps = pacer.render_fps(); last_interaction = 0
 
     game_state = {
         "bpm": 100, # Fixed: Always start at 100 BPM
         "hs_multiplier": settings.get("hs_multiplier", 1.0),
         "scale_bpm": settings.get("scale_bpm", True),
         "is_game_mode": settings.get("is_game_mode", False),
-        "metronome_active": False,
         "demo_mode": False,
         "offset": settings.get("offset", 0.0),
         "auto_randomize": False, # Fixed: Always start at OFF
         "binds": settings["binds"],
         "waiting_for_key": None,
         "undo_stack": None,
-        "combo": 0,
-        "max_combo": 0,
         "hit_glow_time": 0,
-        "hit_glow_col": (255, 255, 255),
-        "current_seq_idx": -1
+        "hit_glow_col": (255, 255, 255)
     }
     
-    start_time = 0; game_session_start = 0 
-    beat_count = 0; sub_beat_count = 0 
-    visual_notes = []; target_notes = []; current_judgment = None 
-    last_beat_time = 0
+    visual_notes = []; current_judgment = None 
     hit_flash_timers = {"don": 0, "ka": 0} 
-    game_stats = {"good": 0, "early": 0, "late": 0, "bad": 0, "miss": 0}
     
     vols = { "don": settings["vol_don"], "ka": settings["vol_ka"], "metro": settings["vol_metro"] }
     for k, v in vols.items(): audio.set_volume(k, v)
@@ -217,46 +319,127 @@ def main():
     sequencer = PatternSequencer(50, H - 60, W - 100, slots=32)
     sequencer.set_pattern_data(settings.get("custom_pattern", [0]*32))
 
+    # Random patterns are prefetched off-thread; loops take one as they are compiled
+    pattern_gen = PatternGenerator(settings["pattern_rules"], slots=sequencer.slots)
+    pattern_gen.start()
+
+    def next_loop_pattern():
+        if game_state["auto_randomize"] and engine.next_loop > 0: return pattern_gen.next_pattern()
+        return sequencer.pattern
+
+    # --- SIMULATION CORE ---
+    engine = TrainerEngine(pattern_source=next_loop_pattern, slots=sequencer.slots)
+    game_stats = engine.stats
+    # Every player judgment (autoplay/demo excluded) is appended to hit_log.bin (see hitlog.HitLogReader)
+    if settings["hit_log"]: engine.hit_log = HitLogWriter()
+    # Sessions are also recorded to replays/ for re-scoring with replay.py
+    if settings["record_inputs"]: engine.recorder = InputRecorder()
+    engine.step_stats = StepStats(sequencer.slots); show_heatmap = True
+    drift = DriftEstimator()  # Live early/late bias; fed from on_judge, shown in the HUD and profiler
+    # Speed trainer: after N loops without BAD/MISS the tempo ramps up by a step over the next loop
+    trainer_cfg = settings["speed_trainer"]
+    trainer = engine.speed_trainer = SpeedTrainer(trainer_cfg.get("clean_loops", 4), trainer_cfg.get("step", 5), trainer_cfg.get("max_bpm", 400))
+    trainer.enabled = trainer_cfg.get("enabled", False)
+
+    def on_judge(judgment, note_type, hit_time, error, is_auto):
+        nonlocal current_judgment
+        current_judgment = JudgmentText(*JUDGE_STYLES[judgment])
+        if judgment == JUDGE_MISS: return
+        if not is_auto:
+            drift.add(error); profiler.set_gauge("drift", f"{drift.ema * 1000:+.1f} ms")
+            if drift.bias and settings["auto_offset"]: apply_drift_offset()
+        game_state["hit_glow_time"] = hit_time
+        game_state["hit_glow_col"] = COLOR_DON if note_type == 'DON' else COLOR_KA
+        if is_auto:
+            # With the audio stream running the hit sound was already scheduled ahead of time
+            if not audio.scheduler: audio.play("don" if note_type == 'DON' else "ka")
+            hit_flash_timers["don" if note_type == 'DON' else "ka"] = hit_time
+
+    def on_beat(beat):
+        if not audio.scheduler: audio.play("metro_tick")
+
+    def on_loop():
+        if not game_state["auto_randomize"]: return
+        # In game mode the new loop's notes were compiled ahead; show the pattern they came from
+        pattern = engine.playing_pattern if engine.game_mode else pattern_gen.next_pattern()
+        if pattern: sequencer.set_pattern_data(pattern)
+
+    engine.on_judge = on_judge
+    engine.on_beat = on_beat
+    audio_sched_until = None  # Audio events are scheduled up to this time
+    engine.on_loop = on_loop
+    engine.on_ramp = lambda bpm: set_bpm(bpm)
+
     fps_display = 0; last_fps_update = 0
+    atlas = None
+    # Dirty-rectangle mode: static UI is cached on its own layer and only the
+    # lane and sequencer regions are redrawn and pushed each frame
+    dirty_rects = settings.get("dirty_rects", True)
+    static_layer = None; static_dirty = True
+    static_overlay = None  # Panel widgets over the lane, when a short window makes them overlap
+    static_damage = []  # Panel areas to repaint without rebuilding the whole layer (hover changes)
 
     # --- UI CALLBACKS ---
     def toggle_gamemode():
         game_state["is_game_mode"] = not game_state["is_game_mode"]
         btn_gamemode.text_override = f"Mode: {'GAME' if game_state['is_game_mode'] else 'VISUALIZER'}"
-        game_state["metronome_active"] = False; target_notes.clear(); visual_notes.clear(); game_state["combo"] = 0
+        engine.stop(); engine.clear_notes(); visual_notes.clear(); engine.combo = 0
     
     def reset_game_state(delay_sec=0):
-        nonlocal start_time, game_session_start, beat_count, sub_beat_count, current_judgment, last_beat_time
-        game_state["metronome_active"] = True
-        game_state["current_seq_idx"] = -1
-        
-        start_time = time.perf_counter() + delay_sec
-        game_session_start = time.perf_counter()
-        
-        beat_count = 0
-        sub_beat_count = 0
-            
-        visual_notes.clear(); target_notes.clear()
+        nonlocal current_judgment, audio_sched_until
+        engine.start(delay_sec)
+        if audio.scheduler: audio.scheduler.clear()
+        audio_sched_until = None
+        visual_notes.clear()
         current_judgment = None
-        game_stats.update({"good": 0, "early": 0, "late": 0, "bad": 0, "miss": 0})
-        game_state["combo"] = 0
-        last_beat_time = 0
+        drift.reset()
 
     def toggle_demo():
         game_state["demo_mode"] = not game_state["demo_mode"]
         btn_demo.text_override = f"Demo: {'ON' if game_state['demo_mode'] else 'OFF'}"
         if game_state["demo_mode"]: reset_game_state()
-        else: game_state["metronome_active"] = False
+        else: engine.stop()
 
     def toggle_auto_random():
         game_state["auto_randomize"] = not game_state["auto_randomize"]
         btn_auto_rand.text_override = f"Auto-Random: {'ON' if game_state['auto_randomize'] else 'OFF'}"
     
+    chart_loading = None  # (thread, preset, [ChartIndex or error]) while a chart preset loads
     def apply_preset(preset):
+        nonlocal chart_loading
+        chart_loading = None
+        if "chart" in preset:
+            # Parsing and indexing a chart can take a while: built on its own thread like the
+            # startup assets, and swapped in by finish_chart_load() once it is ready
+            result = []
+            def load():
+                try: result.append(load_chart(preset["chart"]))
+                except (OSError, ValueError) as e: result.append(e)
+            thread = threading.Thread(target=load, daemon=True); thread.start()
+            chart_loading = (thread, preset, result)
+            dropdown_presets.main_btn.text_override = f"Loading {preset['name']}..."
+            return
+        if engine.chart: engine.chart.index.close(); engine.chart = None
         game_state["undo_stack"] = sequencer.get_pattern_data()
         sequencer.set_pattern_data(preset["data"])
         dropdown_presets.main_btn.text_override = f"Preset: {preset['name']}"
-        if game_state["metronome_active"]: reset_game_state(delay_sec=3.0)
+        if engine.running: reset_game_state(delay_sec=3.0)
+
+    def finish_chart_load():
+        nonlocal chart_loading, static_dirty
+        if chart_loading is None or chart_loading[0].is_alive(): return
+        _, preset, (index,) = chart_loading; chart_loading = None; static_dirty = True
+        if isinstance(index, Exception):
+            print(f"[chart] {preset['chart']} failed to load ({index})")
+            dropdown_presets.main_btn.text_override = "Chart failed to load"; return
+        # Charts replace the step loop; the BPM slider then scales the chart's own tempo
+        if engine.chart: engine.chart.index.close()
+        engine.chart = ChartTimeline(index, *(settings["chart_section"] or ()))
+        # The chart's own base BPM stays the reference (tempo scale 1) even outside the slider's range
+        game_state["bpm"] = engine.chart.base_bpm
+        sld_bpm.val = max(sld_bpm.min_val, min(sld_bpm.max_val, engine.chart.base_bpm)); sld_bpm.update_handle_pos()
+        dropdown_presets.main_btn.text_override = f"Preset: {preset['name']}"
+        if engine.running: reset_game_state(delay_sec=3.0)
 
     def apply_hs(option):
         game_state["hs_multiplier"] = option["val"]
@@ -266,10 +449,44 @@ def main():
         nonlocal vols; vols[target] = max(0.0, min(1.0, vols[target] + amount))
         audio.set_volume(target, vols[target])
         
-    def reset_offset():
-        game_state["offset"] = 0.0; sld_offset.val = 0.0
+    def set_offset(value):
+        nonlocal static_dirty
+        game_state["offset"] = engine.offset = value
+        sld_offset.val = value; sld_offset.update_handle_pos(); static_dirty = True
+
+    def reset_offset(): set_offset(0.0)
+
+    def set_bpm(value):
+        nonlocal static_dirty
+        game_state["bpm"] = sld_bpm.val = value; sld_bpm.update_handle_pos(); static_dirty = True
+
+    def toggle_trainer():
+        trainer.enabled = not trainer.enabled; trainer.reset()
+        btn_trainer.text_override = f"Trainer: {'ON' if trainer.enabled else 'OFF'}"
+
+    def apply_drift_offset():
+        new = max(sld_offset.min_val, min(sld_offset.max_val, drift.suggested_offset(game_state["offset"])))
+        drift.applied(new - game_state["offset"]); set_offset(new)
         
     def start_binding(bind_id): game_state["waiting_for_key"] = bind_id
+
+    def bind_pad(code):
+        """Bind a controller/MIDI code to the bind id waiting for input (one bind per code)."""
+        nonlocal static_dirty
+        for b_id in [b for b, c in controllers.binds.items() if c == code]: del controllers.binds[b_id]
+        controllers.binds[game_state["waiting_for_key"]] = code
+        game_state["waiting_for_key"] = None; static_dirty = True
+
+    def drum_hit(lane, stamp, device):
+        """A DON/KA hit from any input device, stamped in the perf_counter domain."""
+        if game_state["demo_mode"]: return
+        key = "don" if lane == 'DON' else "ka"
+        audio.play(key); hit_flash_timers[key] = stamp
+        if engine.running:
+            if game_state["is_game_mode"]: engine.feed_input(lane, stamp)
+            else: visual_notes.append((lane, stamp))
+        # Input-to-judgment latency: from the device's stamp until the hit was judged
+        controllers.latency.add(device, time.perf_counter() - stamp)
     
     def safe_clear():
         game_state["undo_stack"] = sequencer.get_pattern_data(); sequencer.clear()
@@ -288,133 +505,243 @@ def main():
     
     btn_gamemode = Button(0, 0, 160, 35, f"Mode: {'GAME' if game_state['is_game_mode'] else 'VISUALIZER'}", toggle_gamemode)
     btn_reset_off = Button(0, 0, 60, 25, "Reset", reset_offset)
-    dropdown_hs = Dropdown(0, 0, 180, 35, f"Speed: {game_state['hs_multiplier']}x", SPEED_OPTIONS, apply_hs)
+    dropdown_hs = Dropdown(0, 0, 180, 35, f"Speed: {game_state['hs_multiplier']}x", SPEED_OPTIONS, apply_hs, open_up=True)
     sld_bpm = Slider(0, 0, 300, 40, 400, game_state["bpm"], "BPM", lambda v: game_state.update({"bpm": v}))
     sld_offset = Slider(0, 0, 230, -0.1, 0.1, game_state["offset"], "Global Offset", lambda v: game_state.update({"offset": v}))
+    chk_auto_offset = Checkbox(0, 0, 24, "Auto", settings["auto_offset"], lambda v: settings.update({"auto_offset": v}))
 
     bind_buttons = {}
     bind_configs = [("ka_l", "Left KA"), ("don_l", "Left DON"), ("don_r", "Right DON"), ("ka_r", "Right KA")]
     for b_id, label in bind_configs:
-        bind_buttons[b_id] = Button(0, 0, 80, 25, "", lambda b=b_id: start_binding(b))
+        bind_buttons[b_id] = Button(0, 0, 120, 25, "", lambda b=b_id: start_binding(b))
 
     btn_clear = Button(0, 0, 120, 35, "Clear Pattern", safe_clear)
     btn_undo = Button(0, 0, 120, 35, "Undo Clear", undo_clear)
-    btn_random = Button(0, 0, 120, 35, "Randomize", sequencer.randomize)
+    btn_random = Button(0, 0, 120, 35, "Randomize", lambda: sequencer.set_pattern_data(pattern_gen.next_pattern()))
     btn_auto_rand = Button(0, 0, 170, 35, f"Auto-Random: OFF", toggle_auto_random)
     btn_demo = Button(0, 0, 120, 35, f"Demo: OFF", toggle_demo)
-    dropdown_presets = Dropdown(0, 0, 240, 35, "Select Preset", PRESETS, apply_preset)
+    btn_trainer = Button(0, 0, 140, 35, f"Trainer: {'ON' if trainer.enabled else 'OFF'}", toggle_trainer)
+    dropdown_presets = Dropdown(0, 0, 240, 35, "Select Preset", PRESETS + chart_presets, apply_preset, open_up=True)
 
-    ui_common = [chk_scale_bpm, btn_gamemode, btn_reset_off]
-    ui_common.extend(bind_buttons.values())
-    for row in vol_rows: ui_common.extend([row["minus"], row["plus"]])
-    ui_game_only = [btn_clear, btn_undo, btn_random, btn_auto_rand, btn_demo]
+    ui_game_only = [btn_clear, btn_undo, btn_random, btn_auto_rand, btn_demo, btn_trainer]
 
-    def try_hit_target(input_type, hit_time, is_auto=False):
-        nonlocal current_judgment
-        adj_hit = hit_time - game_state["offset"]
-        best_note = None; min_diff = 1000
-        candidates = [n for n in target_notes if not n.get('hit', False) and n['type'] == input_type]
-        for note in candidates:
-            calc_diff = abs(note['time'] - adj_hit)
-            if calc_diff < min_diff: min_diff = calc_diff; best_note = note
-        
-        hit_window = WINDOW_PERFECT if is_auto else WINDOW_BAD
-        if best_note and min_diff <= hit_window:
-            best_note['hit'] = True 
-            real_diff = best_note['time'] - adj_hit
-            game_state["hit_glow_time"] = hit_time
-            game_state["hit_glow_col"] = COLOR_DON if input_type == 'DON' else COLOR_KA
-            if min_diff <= WINDOW_PERFECT or is_auto: 
-                current_judgment = JudgmentText("GOOD!", COL_JUDGE_PERFECT); game_stats["good"] += 1; game_state["combo"] += 1
-            elif min_diff <= WINDOW_OK:
-                if real_diff < 0: current_judgment = JudgmentText("LATE", COL_JUDGE_LATE); game_stats["late"] += 1
-                else: current_judgment = JudgmentText("EARLY", COL_JUDGE_EARLY); game_stats["early"] += 1
-                game_state["combo"] += 1
-            else: 
-                current_judgment = JudgmentText("BAD", COL_JUDGE_BAD); game_stats["bad"] += 1; game_state["combo"] = 0
-            game_state["max_combo"] = max(game_state["combo"], game_state["max_combo"])
-            return True
-        return False
-
-    while True:
-        current_time = time.perf_counter()
-        W, H = screen.get_size()
-        screen.fill(COLOR_BG)
-        
-        BAR_Y, BAR_H, NOTE_R = 120, 200, 42 
-        HIT_X = W // 4 if game_state["is_game_mode"] else W - 300
-        center_y = BAR_Y + (BAR_H // 2) 
-        
-        LEFT_MARGIN, SPACING_Y, BTN_GAP = 50, 35, 12
-        y_calc = H - 530 
-        
-        # Calculate Effective Scroll Speed
-        base_scroll = 500
-        if game_state["scale_bpm"]: base_scroll = (game_state["bpm"] / 120.0) * 500
-        eff_scroll = base_scroll * game_state["hs_multiplier"]
-
-        # UI Positioning
+    def layout_ui():
+        """Absolute widget positions; only re-run by ui_tree when the window size or mode changes."""
+        y_calc = H - 530
         for row in vol_rows:
             row["minus"].rect.topleft = (LEFT_MARGIN + 160, y_calc)
             row["plus"].rect.topleft = (row["minus"].rect.right + 5, y_calc)
             y_calc += SPACING_Y
-        
+
         y_calc += 10
         sld_bpm.set_pos(LEFT_MARGIN, y_calc + 30); y_calc += 55
         sld_offset.set_pos(LEFT_MARGIN, y_calc + 30)
         btn_reset_off.rect.topleft = (sld_offset.rect.right + 10, sld_offset.rect.y - 5)
+        chk_auto_offset.rect.topleft = (btn_reset_off.rect.right + 10, btn_reset_off.rect.y)
         y_calc += 55
         chk_scale_bpm.rect.topleft = (LEFT_MARGIN, y_calc); y_calc += SPACING_Y
         dropdown_hs.main_btn.rect.topleft = (LEFT_MARGIN, y_calc); y_calc += 45
-        for i, b in enumerate(dropdown_hs.option_buttons):
-            b.rect.topleft = (dropdown_hs.main_btn.rect.x, dropdown_hs.main_btn.rect.y - (len(dropdown_hs.option_buttons) - i) * b.rect.h)
+        dropdown_hs.place_options()
         btn_gamemode.rect.topleft = (LEFT_MARGIN, y_calc)
 
         if game_state["is_game_mode"]:
-            y_row = H - 110 
+            y_row = H - 110
             btn_clear.rect.topleft = (LEFT_MARGIN, y_row)
             btn_undo.rect.topleft = (btn_clear.rect.right + BTN_GAP, y_row)
             btn_random.rect.topleft = (btn_undo.rect.right + BTN_GAP, y_row)
             btn_auto_rand.rect.topleft = (btn_random.rect.right + BTN_GAP, y_row)
             dropdown_presets.main_btn.rect.topleft = (btn_auto_rand.rect.right + BTN_GAP, y_row)
             btn_demo.rect.topleft = (dropdown_presets.main_btn.rect.right + BTN_GAP, y_row)
-            for i, b in enumerate(dropdown_presets.option_buttons):
-                b.rect.topleft = (dropdown_presets.main_btn.rect.x, dropdown_presets.main_btn.rect.y - (len(dropdown_presets.option_buttons) - i) * b.rect.h)
+            btn_trainer.rect.topleft = (btn_demo.rect.right + BTN_GAP, y_row)
+            dropdown_presets.place_options()
             sequencer.update_layout(50, H - 50, W - 100)
 
         bx, by = W - 320, H - 530
         for b_id, label in bind_configs:
-            btn = bind_buttons[b_id]; btn.rect.topleft = (bx + 110, by)
-            btn.text_override = "???" if game_state["waiting_for_key"] == b_id else pygame.key.name(game_state["binds"][b_id]).upper()
-            by += SPACING_Y
+            bind_buttons[b_id].rect.topleft = (bx + 110, by); by += SPACING_Y
+
+    # Mouse events go only to the widget under the cursor; later entries sit on top
+    ui_tree = WidgetTree(layout_ui)
+    in_game = lambda: game_state["is_game_mode"]
+    for el in [chk_scale_bpm, btn_gamemode, btn_reset_off, chk_auto_offset, *bind_buttons.values(), sld_bpm, sld_offset]: ui_tree.add(el)
+    for row in vol_rows: ui_tree.add(row["minus"]); ui_tree.add(row["plus"])
+    for el in ui_game_only + [sequencer]: ui_tree.add(el, in_game)
+    ui_tree.add(dropdown_hs); ui_tree.add(dropdown_presets, in_game)
+
+    def draw_lane(surf):
+        """Note lane, hit feedback, combo/judgment and the idle prompt."""
+        nonlocal atlas, visual_notes
+        surf.fill_rect(COLOR_BAR, (0, BAR_Y, W, BAR_H))
+    
+        if engine.running:
+            # Beat lines follow the tempo map, so they bunch up or spread out through a ramp
+            tempo = engine.tempo
+            start_idx = math.floor(tempo.beat_at(current_time - HIT_X / eff_scroll))
+            end_idx = math.ceil(tempo.beat_at(current_time + (W - HIT_X) / eff_scroll)) + 1
+            for i in range(start_idx, end_idx):
+                lx = HIT_X + (tempo.time_at(i) - current_time) * eff_scroll
+                if 0 < lx < W:
+                    col = (200, 200, 200) if i % 4 == 0 else (80, 80, 80)
+                    surf.line(col, (int(lx), BAR_Y), (int(lx), BAR_Y + BAR_H), 3 if i % 4 == 0 else 1)
+
+        # Lane sprites: glow, receptor, flashes, hit line and notes go out in one blit batch
+        if atlas is None or atlas.key != (NOTE_R, BAR_H, (W, H)):
+            atlas = SpriteAtlas(NOTE_R, BAR_H, (W, H), {'DON': COLOR_DON, 'KA': COLOR_KA})
+        batch = []
+        # The canvas picks the fade: a pre-baked alpha frame in software, texture alpha on the renderer
+        glow = surf.fade(atlas.glow_frames(game_state["hit_glow_col"]), current_time - game_state["hit_glow_time"], GLOW_DURATION)
+        if glow: batch.append((glow, (HIT_X - NOTE_R*2.5, center_y - NOTE_R*2.5)))
+        batch.append((atlas.ring, (HIT_X - NOTE_R, center_y - NOTE_R)))
+        for t, note_type in [("don", 'DON'), ("ka", 'KA')]:
+            flash = surf.fade(atlas.flash[note_type], current_time - hit_flash_timers[t], FLASH_DURATION)
+            if flash: batch.append((flash, (HIT_X - NOTE_R, center_y - NOTE_R)))
+        line_w = 4 if not game_state["is_game_mode"] else 2
+        batch.append((atlas.hit_lines[line_w], (HIT_X - line_w // 2, BAR_Y - 20)))
+
+        if engine.running:
+            if game_state["is_game_mode"]:
+                for note in engine.visible_notes(current_time - (HIT_X + 100) / eff_scroll, current_time + (W - HIT_X + 100) / eff_scroll):
+                    nx = HIT_X + (note.time - current_time) * eff_scroll
+                    batch.append((atlas.notes[note.type], (int(nx) - NOTE_R, center_y - NOTE_R)))
+            else:
+                visual_notes = [n for n in visual_notes if (HIT_X - (current_time - n[1]) * eff_scroll) > -100]
+                for n_type, n_time in visual_notes:
+                    nx = HIT_X - (current_time - n_time) * eff_scroll
+                    if -100 < nx < W + 50: batch.append((atlas.notes[n_type], (int(nx) - NOTE_R, center_y - NOTE_R)))
+        surf.blits(batch, False)
+
+        if engine.running:
+            if game_state["is_game_mode"] and engine.combo >= 10:
+                c_surf = render_text(font_combo, f"{engine.combo}", True, (255, 255, 255))
+                surf.blit(c_surf, (HIT_X - c_surf.get_width()//2, BAR_Y - 80))
+            if current_judgment: current_judgment.draw(surf, HIT_X, center_y)
+        else:
+            txt = render_text(font_bpm, "PRESS SPACE TO START", True, (80, 80, 80)); surf.blit(txt, txt.get_rect(center=(W//2, center_y)))
+            if game_state["is_game_mode"]:
+                total = sum(game_stats.values())
+                if total > 10:
+                    tip = ""
+                    if game_stats["early"] > (game_stats["good"] + game_stats["late"]) * 0.4: tip = "TIP: Hitting EARLY! Increase Offset or relax."
+                    elif game_stats["late"] > (game_stats["good"] + game_stats["early"]) * 0.4: tip = "TIP: Hitting LATE! Decrease Offset or anticipate."
+                    elif game_stats["miss"] > total * 0.3: tip = "TIP: Too many MISSes? Try slowing down BPM."
+                    if tip:
+                        ts = render_text(font_ui, tip, True, (255, 255, 0)); surf.blit(ts, ts.get_rect(center=(W//2, center_y + 160)))
+
+    def draw_static_ui(surf):
+        """Control panel widgets and labels; only changes on interaction or resize."""
+        cur_y = H - 530
+        for row in vol_rows:
+            surf.blit(render_text(font_ui, f"{row['label']}: {int(vols[row['key']] * 100)}%", True, (255,255,255)), (LEFT_MARGIN, cur_y + 2))
+            row["minus"].draw(surf); row["plus"].draw(surf); cur_y += SPACING_Y
+        sld_bpm.draw(surf); sld_offset.draw(surf); btn_reset_off.draw(surf); chk_auto_offset.draw(surf)
+        chk_scale_bpm.draw(surf); dropdown_hs.draw(surf); btn_gamemode.draw(surf)
+        if game_state["is_game_mode"]:
+            for el in ui_game_only: el.draw(surf)
+            dropdown_presets.draw(surf)
 
+        bx = W - 320; by = H - 530
+        for b_id, label in bind_configs:
+            surf.blit(render_text(font_ui, f"{label}:", True, (200, 200, 200)), (bx, by + 2))
+            bind_buttons[b_id].draw(surf); by += SPACING_Y
+
+    def draw_hud(surf):
+        """Sequencer playhead, session stats, BPM and FPS: redrawn every frame."""
+        if game_state["is_game_mode"]:
+            # Drawn in software; on the texture backend the strip is uploaded as one layer per frame
+            seq_rect = pygame.Rect(0, sequencer.y - 12, W, sequencer.box_size + 24)
+            surf.layer("sequencer", seq_rect, lambda s, origin: sequencer.draw(s, engine.seq_idx if engine.running else -1, engine.step_stats if show_heatmap else None, origin))
+            stats_x, lh = HIT_X - 280, 28; sy = center_y - (3.5 * lh)
+            el_s = int(max(0, time.perf_counter() - engine.session_start)) if engine.running else 0
+            surf.blit(render_text(font_stats, f"Time: {el_s // 60:02}:{el_s % 60:02}", True, (255, 255, 255)), (stats_x, sy))
+            for i, (l, v, c) in enumerate([("GOOD ", game_stats['good'], COL_JUDGE_PERFECT), ("EARLY", game_stats['early'], COL_JUDGE_EARLY), ("LATE ", game_stats['late'], COL_JUDGE_LATE), ("BAD  ", game_stats['bad'], COL_JUDGE_BAD), ("MISS ", game_stats['miss'], COL_JUDGE_MISS)]):
+                surf.blit(render_text(font_stats, f"{l}: {v:02d}", True, c), (stats_x, sy + (i+1)*lh))
+            if engine.running and drift.hits:
+                # Live bias readout; the suggestion only shows once the hysteresis has flagged a drift
+                if drift.bias: msg, col = f"Drift {'LATE' if drift.bias > 0 else 'EARLY'} {drift.ema * 1000:+.0f} ms -> offset {drift.suggested_offset(game_state['offset']):+.3f}", COL_JUDGE_LATE if drift.bias > 0 else COL_JUDGE_EARLY
+                else: msg, col = f"Drift {drift.ema * 1000:+.1f} ms", (150, 150, 150)
+                surf.blit(render_text(font_ui, msg, True, col), (stats_x, sy + 6 * lh + 6))
+        surf.blit(render_text(font_bpm, f"BPM: {int(engine.tempo.bpm_at(current_time) if engine.running else game_state['bpm'])}", True, (255, 255, 255)), (W - 220, 50))
+        surf.blit(render_text(font_ui, f"FPS: {fps_display} / {target_fps}", True, (150, 150, 150)), (W - 220, 95))
+        if profiler.overlay: draw_profiler(surf)
+
+    def repaint_static(area=None):
+        """Redraw the static layer (and the lane overlay, if any): all of it or just `area`."""
+        for layer, bg in ((static_layer, COLOR_BG), (static_overlay, (0, 0, 0, 0))):
+            if layer is None: continue
+            layer.set_clip(area); layer.fill(bg); draw_static_ui(layer); layer.set_clip(None)
+        # The lane band stays plain background; the overlay puts the widgets back on top of the lane
+        if static_overlay: static_layer.fill(COLOR_BG, lane_rect.clip(area) if area else lane_rect)
+
+    def profiler_rect():
+        return pygame.Rect(LEFT_MARGIN - 10, BAR_Y + BAR_H + 10, 440, 20 * (len(PHASES) + 3 + len(profiler.gauges)))
+
+    def draw_profiler(surf):
+        """Frame-phase percentile table; the summary is refreshed twice a second."""
+        nonlocal prof_lines, last_prof_update
+        if current_time - last_prof_update > 0.5:
+            # Refreshed with the table, so changing readouts don't churn the text cache every frame
+            profiler.set_gauge("text cache", f"{len(text_cache)} ({text_cache.hit_rate:.0%} hit)")
+            profiler.set_gauge("input jitter", f"{stamper.jitter * 1000:.1f} ms (frame {clock.get_time()} ms)")
+            for device, (mean, worst) in controllers.latency.summary().items():
+                profiler.set_gauge(f"latency {device}", f"{mean * 1000:.2f} ms (worst {worst * 1000:.2f})")
+            # Mixer config in use (as picked by --calibrate-audio) and whether it holds up in play
+            rate = audio.mixer_format[0] or 1
+            profiler.set_gauge("audio", f"{rate} Hz / {audio.buffer} frames ({audio.buffer / rate * 1000:.1f} ms)" + (f", {audio.scheduler.underruns} underruns" if audio.scheduler else ""))
+            summary = profiler.summary(); last_prof_update = current_time
+            prof_lines = [f"{'phase':<8}{'p50':>8}{'p95':>8}{'p99':>8}{'worst':>8}"]
+            for name, st in summary.items():
+                prof_lines.append(f"{name:<8}{st['p50']:>8.2f}{st['p95']:>8.2f}{st['p99']:>8.2f}{st['worst']:>8.2f}")
+            prof_lines += [f"{name}: {value}" for name, value in profiler.gauges.items()]
+        rect = profiler_rect()
+        surf.fill_rect(COLOR_BAR, rect)
+        for i, line in enumerate(prof_lines):
+            surf.blit(render_text(font_prof, line, True, (180, 180, 180)), (rect.x + 10, rect.y + 5 + i * 20))
+
+    def sim_tick(now):
+        """Fixed-rate simulation step: stamped input, judgment, note/beat updates and audio scheduling."""
+        nonlocal screen, static_dirty, audio_sched_until, last_interaction, show_heatmap
         # --- EVENT HANDLING ---
-        for event in pygame.event.get():
+        # Events carry the time they were pulled off SDL's queue, not the frame start
+        for stamp, event in stamper.drain():
+            if event.type == pygame.MOUSEMOTION: last_interaction = stamp
+            elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED):
+                static_dirty = True; last_interaction = stamp
+            elif event.type == pygame.KEYDOWN:
+                last_interaction = stamp
+                if game_state["waiting_for_key"] or event.key not in game_state["binds"].values(): static_dirty = True
+
             if event.type == pygame.QUIT:
-                save_settings({"bpm": game_state["bpm"], "hs_multiplier": game_state["hs_multiplier"], "scale_bpm": game_state["scale_bpm"], "vol_don": vols["don"], "vol_ka": vols["ka"], "vol_metro": vols["metro"], "is_game_mode": game_state["is_game_mode"], "offset": game_state["offset"], "auto_randomize": game_state["auto_randomize"], "custom_pattern": sequencer.get_pattern_data(), "binds": game_state["binds"]})
+                save_settings({"bpm": game_state["bpm"], "hs_multiplier": game_state["hs_multiplier"], "scale_bpm": game_state["scale_bpm"], "vol_don": vols["don"], "vol_ka": vols["ka"], "vol_metro": vols["metro"], "is_game_mode": game_state["is_game_mode"], "offset": game_state["offset"], "auto_randomize": game_state["auto_randomize"], "custom_pattern": sequencer.get_pattern_data(), "binds": game_state["binds"], "dirty_rects": dirty_rects, "pacing_mode": pacer.mode, "render_fps_cap": pacer.render_cap, "sim_hz": settings["sim_hz"], "precise_sleep": pacer.precise_sleep, "pattern_rules": pattern_gen.rules, "hit_log": settings["hit_log"], "record_inputs": settings["record_inputs"], "auto_offset": settings["auto_offset"], "chart_section": settings["chart_section"], "speed_trainer": dict(settings["speed_trainer"], enabled=trainer.enabled), "pad_binds": controllers.binds, "midi_min_velocity": settings["midi_min_velocity"], "audio_frequency": settings["audio_frequency"], "audio_buffer": settings["audio_buffer"], "render_backend": settings["render_backend"]})
+                font_registry.save(); audio.close(); pattern_gen.stop(); controllers.stop()
+                engine.stop()
+                if engine.hit_log: engine.hit_log.close()
+                if engine.recorder: engine.recorder.save(wait=True)
+                if profiler.used: profiler.dump()
                 pygame.quit(); sys.exit()
             
+            if event.type in JOY_EVENTS:
+                code = controllers.joystick_code(event)
+                if code and game_state["waiting_for_key"]: bind_pad(code); continue
+                lane = controllers.lane(code) if code else None
+                if lane: last_interaction = stamp; drum_hit(lane, stamp, controllers.device_name(event))
+                continue
+
             if game_state["waiting_for_key"] and event.type == pygame.KEYDOWN:
                 if event.key != pygame.K_ESCAPE: game_state["binds"][game_state["waiting_for_key"]] = event.key
                 game_state["waiting_for_key"] = None; continue
 
-            if game_state["is_game_mode"] and dropdown_presets.handle_event(event): continue
-            if dropdown_hs.handle_event(event): continue
-            if sld_bpm.handle_event(event): continue
-            if sld_offset.handle_event(event): continue
-            
-            ui_handled = False
-            for el in ui_common:
-                if el.handle_event(event): ui_handled = True
-            
-            if game_state["is_game_mode"]:
-                for el in ui_game_only:
-                    if el.handle_event(event): ui_handled = True
-                if not ui_handled and sequencer.handle_event(event): ui_handled = True
-            
+            hovered = ui_tree.hovered
+            ui_handled = ui_tree.dispatch(event)
+            if event.type == pygame.MOUSEMOTION:
+                # Drags and open menus repaint the panel; plain hover only the widgets it moved between
+                if ui_handled or dropdown_hs.is_open or dropdown_presets.is_open: static_dirty = True
+                elif ui_tree.hovered is not hovered: static_damage.extend(ui_tree.bounds(w) for w in (hovered, ui_tree.hovered) if w)
             if not ui_handled and event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE: pygame.event.post(pygame.event.Event(pygame.QUIT))
-                if event.key == pygame.K_F11:
+                if event.key == pygame.K_F3: profiler.toggle_overlay()
+                if event.key == pygame.K_F4: show_heatmap = not show_heatmap
+                if event.key == pygame.K_F11 and gpu: gpu.toggle_fullscreen()
+                elif event.key == pygame.K_F11:
                     is_full = screen.get_flags() & pygame.FULLSCREEN
                     screen = pygame.display.set_mode((0,0), pygame.FULLSCREEN) if not is_full else pygame.display.set_mode((1920, 1080), pygame.RESIZABLE)
                 
@@ -429,138 +756,114 @@ def main():
                     sld_bpm.update_handle_pos()
                 
                 if event.key == pygame.K_SPACE:
-                    game_state["metronome_active"] = not game_state["metronome_active"]
-                    if game_state["metronome_active"]: reset_game_state()
+                    if engine.running: engine.stop()
+                    else: reset_game_state()
                 
                 is_don = event.key in [game_state["binds"]["don_l"], game_state["binds"]["don_r"]]
                 is_ka = event.key in [game_state["binds"]["ka_l"], game_state["binds"]["ka_r"]]
-                if not game_state["demo_mode"] and (is_don or is_ka):
-                    audio.play("don" if is_don else "ka")
-                    hit_flash_timers["don" if is_don else "ka"] = current_time
-                    if game_state["metronome_active"]:
-                        if game_state["is_game_mode"]: try_hit_target('DON' if is_don else 'KA', current_time)
-                        else: visual_notes.append(('DON' if is_don else 'KA', current_time))
+                if is_don or is_ka: drum_hit('DON' if is_don else 'KA', stamp, "keyboard")
 
-        # --- UPDATE LOGIC ---
-        if game_state["metronome_active"]:
-            b_int = 60.0 / game_state["bpm"]
-            sb_int = b_int / 4; elapsed = current_time - start_time
-            valid_elapsed = max(0, elapsed)
-            
-            if elapsed >= 0:
-                if int(valid_elapsed / b_int) > beat_count: 
-                    beat_count = int(valid_elapsed / b_int); audio.play("metro_tick")
-                new_idx = int(valid_elapsed / sb_int) % 32
-                
-                # Robust Loop Detection for Auto-Randomizer
-                if game_state["auto_randomize"] and new_idx == 0 and game_state["current_seq_idx"] == 31:
-                    sequencer.randomize()
-                    
-                game_state["current_seq_idx"] = new_idx
-                if game_state["is_game_mode"] and int(valid_elapsed / sb_int) > sub_beat_count:
-                    sub_beat_count = int(valid_elapsed / sb_int)
-                    lookahead = int(((W - HIT_X + 100) / eff_scroll) / sb_int)
-                    future_idx = (sub_beat_count + lookahead) % 32
-                    if sequencer.pattern[future_idx] > 0:
-                        target_notes.append({'type': 'DON' if sequencer.pattern[future_idx] == 1 else 'KA', 'time': start_time + ((sub_beat_count + lookahead) * sb_int), 'hit': False})
-
-            if game_state["demo_mode"]:
-                for n in target_notes:
-                    if not n['hit'] and current_time >= n['time'] + game_state["offset"]:
-                        audio.play("don" if n['type'] == 'DON' else "ka"); hit_flash_timers["don" if n['type'] == 'DON' else "ka"] = current_time
-                        try_hit_target(n['type'], current_time, is_auto=True)
+        # MIDI hits come stamped with the device's own time, converted by the poller thread
+        for stamp, code, device, velocity in controllers.drain_midi():
+            if game_state["waiting_for_key"]: bind_pad(code); continue
+            lane = controllers.lane(code)
+            if lane: last_interaction = stamp; drum_hit(lane, stamp, device)
 
-        # --- RENDERING ---
-        pygame.draw.rect(screen, COLOR_BAR, (0, BAR_Y, W, BAR_H))
+        t_events = time.perf_counter(); profiler.add("events", t_events - now)
+
+        # --- UPDATE LOGIC ---
+        engine.advance(now)
+
+        # Hand upcoming ticks and demo hits to the audio stream slightly ahead of time
+        if audio.scheduler:
+            if engine.running:
+                sched_to = now + AUDIO_LEAD
+                for name, t in engine.audio_events(max(audio_sched_until or now, now), sched_to): audio.schedule(name, t)
+                audio_sched_until = sched_to
+            elif audio_sched_until is not None:
+                audio.scheduler.clear(); audio_sched_until = None
+        profiler.add("update", time.perf_counter() - t_events)
+
+    trace.mark("ui")
+    while True:
+        current_time = time.perf_counter()
+        profiler.begin_frame(current_time)
+        W, H = gpu.update_size() if gpu else screen.get_size()
         
-        if game_state["metronome_active"]:
-            b_int = 60.0 / game_state["bpm"]; rel_start = current_time - start_time
-            start_idx = int((-HIT_X / eff_scroll + rel_start) / b_int) - 1
-            end_idx = int(((W - HIT_X) / eff_scroll + rel_start) / b_int) + 1
-            for i in range(start_idx, end_idx):
-                lx = HIT_X + (start_time + i * b_int - current_time) * eff_scroll
-                if 0 < lx < W:
-                    col = (200, 200, 200) if i % 4 == 0 else (80, 80, 80)
-                    pygame.draw.line(screen, col, (lx, BAR_Y), (lx, BAR_Y + BAR_H), 3 if i % 4 == 0 else 1)
-
-        # Glow and Feedback
-        glow_elapsed = current_time - game_state["hit_glow_time"]
-        if glow_elapsed < 0.15:
-            alpha = int(180 * (1.0 - (glow_elapsed / 0.15)))
-            s = pygame.Surface((NOTE_R*5, NOTE_R*5), pygame.SRCALPHA)
-            pygame.draw.circle(s, (*game_state["hit_glow_col"], alpha), (NOTE_R*2.5, NOTE_R*2.5), NOTE_R * 1.8)
-            screen.blit(s, (HIT_X - NOTE_R*2.5, center_y - NOTE_R*2.5))
-
-        pygame.draw.circle(screen, (200, 200, 200), (HIT_X, center_y), NOTE_R, 4)
-        for t, c in [("don", COLOR_DON), ("ka", COLOR_KA)]:
-            flash = current_time - hit_flash_timers[t]
-            if flash < 0.1:
-                s = pygame.Surface((NOTE_R*2, NOTE_R*2), pygame.SRCALPHA)
-                pygame.draw.circle(s, (*c, int(150 * (1.0 - flash/0.1))), (NOTE_R, NOTE_R), NOTE_R)
-                screen.blit(s, (HIT_X - NOTE_R, center_y - NOTE_R))
-
-        pygame.draw.line(screen, COLOR_HIT_LINE, (HIT_X, BAR_Y - 20), (HIT_X, BAR_Y + BAR_H + 20), 4 if not game_state["is_game_mode"] else 2)
-
-        if game_state["metronome_active"]:
-            if game_state["is_game_mode"]:
-                missed = [n for n in target_notes if n['time'] < current_time - WINDOW_BAD and not n['hit']]
-                if missed:
-                    current_judgment = JudgmentText("MISS", COL_JUDGE_MISS); game_stats["miss"] += len(missed); game_state["combo"] = 0
-                    for m in missed: target_notes.remove(m)
-                for note in target_notes:
-                    if not note.get('hit'):
-                        nx = HIT_X + (note['time'] - current_time) * eff_scroll
-                        if -100 < nx < W + 100:
-                            pygame.draw.circle(screen, (255,255,255), (int(nx), center_y), NOTE_R)
-                            pygame.draw.circle(screen, COLOR_DON if note['type'] == 'DON' else COLOR_KA, (int(nx), center_y), int(NOTE_R * 0.9))
-                if game_state["combo"] >= 10:
-                    c_surf = font_combo.render(f"{game_state['combo']}", True, (255, 255, 255))
-                    screen.blit(c_surf, (HIT_X - c_surf.get_width()//2, BAR_Y - 80))
-            else:
-                visual_notes = [n for n in visual_notes if (HIT_X - (current_time - n[1]) * eff_scroll) > -100]
-                for n_type, n_time in visual_notes:
-                    nx = HIT_X - (current_time - n_time) * eff_scroll
-                    if -100 < nx < W + 50:
-                        pygame.draw.circle(screen, (255,255,255), (int(nx), center_y), NOTE_R)
-                        pygame.draw.circle(screen, COLOR_DON if n_type == 'DON' else COLOR_KA, (int(nx), center_y), int(NOTE_R * 0.9))
-            if current_judgment: current_judgment.draw(screen, HIT_X, center_y)
-        else:
-            txt = font_bpm.render("PRESS SPACE TO START", True, (80, 80, 80)); screen.blit(txt, txt.get_rect(center=(W//2, center_y)))
-            if game_state["is_game_mode"]:
-                total = sum(game_stats.values())
-                if total > 10:
-                    tip = ""
-                    if game_stats["early"] > (game_stats["good"] + game_stats["late"]) * 0.4: tip = "TIP: Hitting EARLY! Increase Offset or relax."
-                    elif game_stats["late"] > (game_stats["good"] + game_stats["early"]) * 0.4: tip = "TIP: Hitting LATE! Decrease Offset or anticipate."
-                    elif game_stats["miss"] > total * 0.3: tip = "TIP: Too many MISSes? Try slowing down BPM."
-                    if tip:
-                        ts = font_ui.render(tip, True, (255, 255, 0)); screen.blit(ts, ts.get_rect(center=(W//2, center_y + 160)))
+        BAR_Y, BAR_H, NOTE_R = 120, 200, 42 
+        HIT_X = W // 4 if game_state["is_game_mode"] else W - 300
+        center_y = BAR_Y + (BAR_H // 2) 
+        
+        LEFT_MARGIN, SPACING_Y, BTN_GAP = 50, 35, 12
 
-        # DRAW UI
-        cur_y = H - 530
-        for row in vol_rows:
-            screen.blit(font_ui.render(f"{row['label']}: {int(vols[row['key']] * 100)}%", True, (255,255,255)), (LEFT_MARGIN, cur_y + 2))
-            row["minus"].draw(screen); row["plus"].draw(screen); cur_y += SPACING_Y
-        sld_bpm.draw(screen); sld_offset.draw(screen); btn_reset_off.draw(screen)
-        chk_scale_bpm.draw(screen); dropdown_hs.draw(screen); btn_gamemode.draw(screen)
+        # Calculate Effective Scroll Speed
+        base_scroll = 500
+        if game_state["scale_bpm"]: base_scroll = (game_state["bpm"] / 120.0) * 500
+        eff_scroll = base_scroll * game_state["hs_multiplier"]
 
-        if game_state["is_game_mode"]:
-            for el in ui_game_only: el.draw(screen)
-            dropdown_presets.draw(screen); sequencer.draw(screen, game_state["current_seq_idx"] if game_state["metronome_active"] else -1)
-            stats_x, lh = HIT_X - 280, 28; sy = center_y - (3.5 * lh)
-            el_s = int(max(0, time.perf_counter() - game_session_start)) if game_state["metronome_active"] else 0
-            screen.blit(font_stats.render(f"Time: {el_s // 60:02}:{el_s % 60:02}", True, (255, 255, 255)), (stats_x, sy))
-            for i, (l, v, c) in enumerate([("GOOD ", game_stats['good'], COL_JUDGE_PERFECT), ("EARLY", game_stats['early'], COL_JUDGE_EARLY), ("LATE ", game_stats['late'], COL_JUDGE_LATE), ("BAD  ", game_stats['bad'], COL_JUDGE_BAD), ("MISS ", game_stats['miss'], COL_JUDGE_MISS)]):
-                screen.blit(font_stats.render(f"{l}: {v:02d}", True, c), (stats_x, sy + (i+1)*lh))
+        engine.bpm = game_state["bpm"]; engine.offset = game_state["offset"]
+        engine.game_mode = game_state["is_game_mode"]; engine.auto_play = game_state["demo_mode"]
+        engine.lookahead_time = (W - HIT_X + 100) / eff_scroll
+        pattern_gen.set_bpm(game_state["bpm"])
 
-        bx = W - 320; by = H - 530
-        for b_id, label in bind_configs:
-            screen.blit(font_ui.render(f"{label}:", True, (200, 200, 200)), (bx, by + 2))
-            bind_buttons[b_id].draw(screen); by += SPACING_Y
+        ui_tree.update_layout((W, H, game_state["is_game_mode"]))
+        finish_chart_load()
+        for b_id in bind_buttons:
+            pad = bind_label(controllers.binds.get(b_id))
+            bind_buttons[b_id].text_override = "???" if game_state["waiting_for_key"] == b_id else pygame.key.name(game_state["binds"][b_id]).upper() + (f" / {pad}" if pad else "")
+        profiler.mark("layout")
 
+        sim_tick(current_time); profiler.skip()
+
+        # --- RENDERING ---
         if current_time - last_fps_update > 5.0: fps_display = int(clock.get_fps()); last_fps_update = current_time
-        screen.blit(font_bpm.render(f"BPM: {int(game_state['bpm'])}", True, (255, 255, 255)), (W - 220, 50))
-        screen.blit(font_ui.render(f"FPS: {fps_display} / {target_fps}", True, (150, 150, 150)), (W - 220, 95))
-        pygame.display.flip(); clock.tick(target_fps)
+        # Everything that moves lives in the lane band (y 30-400) or on the sequencer row
+        lane_rect = pygame.Rect(0, 30, W, 370)
+        overlaps = dropdown_hs.is_open or (game_state["is_game_mode"] and dropdown_presets.is_open)
+        panel_over_lane = H - 530 < lane_rect.bottom  # Short windows (under 930 px)
+        if profiler.overlay and profiler_rect().bottom > H - 530: overlaps = True
+        canvas = gpu or SurfaceCanvas(screen)
+        if gpu:
+            # Lane sprites and text are cached textures; the static panel is re-uploaded only when it changed,
+            # and only the hovered widgets' rects when just the hover moved
+            gpu.begin(COLOR_BG)
+            draw_lane(canvas); profiler.mark("lane")
+            gpu.layer("static", gpu.get_rect(), lambda s, origin: draw_static_ui(s), static_dirty, static_damage)
+            static_dirty = False; static_damage.clear()
+            draw_hud(canvas); profiler.mark("ui")
+            gpu.present(); profiler.mark("flip")
+        elif not dirty_rects or overlaps:
+            screen.fill(COLOR_BG)
+            draw_lane(canvas); profiler.mark("lane")
+            draw_static_ui(screen); draw_hud(canvas); profiler.mark("ui")
+            static_dirty = True; static_damage.clear()
+            pygame.display.flip(); profiler.mark("flip")
+        else:
+            if static_dirty or static_layer is None or static_layer.get_size() != (W, H) or (static_overlay is not None) != panel_over_lane:
+                static_layer = pygame.Surface((W, H)).convert()
+                static_overlay = pygame.Surface((W, H), pygame.SRCALPHA) if panel_over_lane else None
+                repaint_static(); static_damage.clear()
+                screen.blit(static_layer, (0, 0)); dirty = [screen.get_rect()]
+                static_dirty = False
+            else:
+                dirty = [lane_rect]
+                if game_state["is_game_mode"]:
+                    dirty.append(pygame.Rect(0, sequencer.y - 12, W, sequencer.box_size + 24))
+                if profiler.overlay: dirty.append(profiler_rect())
+                for r in static_damage: repaint_static(r); dirty.append(r)
+                static_damage.clear()
+                for r in dirty: screen.blit(static_layer, r, r)
+            profiler.mark("ui")
+            draw_lane(canvas)
+            if static_overlay: screen.blit(static_overlay, lane_rect, lane_rect)
+            profiler.mark("lane")
+            draw_hud(canvas); profiler.mark("ui")
+            pygame.display.update(dirty); profiler.mark("flip")
+        trace.finish()
+        # Until the next render is due, keep running simulation ticks at the sim rate
+        clock.tick()
+        pacer.active = engine.running or current_time - last_interaction < 1.0
+        target_fps = pacer.render_fps()
+        pacer.wait_for_render(current_time, lambda: sim_tick(time.perf_counter()))
 
 if __name__ == "__main__": main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+import time
+
+# Render cadence modes
+PACING_DISPLAY = "display"    # Render at the monitor refresh rate
+PACING_CAPPED = "capped"      # Render at a fixed user cap
+PACING_ADAPTIVE = "adaptive"  # Refresh rate while playing, IDLE_FPS when nothing moves
+PACING_MODES = (PACING_DISPLAY, PACING_CAPPED, PACING_ADAPTIVE)
+IDLE_FPS = 30
+
+class FramePacer:
+    """
+    Splits the loop into a fixed-rate simulation tick (input, judgment, scheduling)
+    and a separate render cadence. Between renders the pacer sleeps until the next
+    tick is due and runs it, so judgment fidelity no longer follows the frame rate
+    and the CPU is idle instead of redrawing frames nobody sees.
+    """
+    SPIN_MARGIN = 0.0015
+
+    def __init__(self, refresh_rate, mode=PACING_DISPLAY, render_cap=144, sim_hz=1000, precise_sleep=False, clock=time.perf_counter):
+        self.refresh_rate = refresh_rate
+        self.mode = mode if mode in PACING_MODES else PACING_DISPLAY
+        self.render_cap = render_cap
+        self.sim_interval = 1.0 / max(60, sim_hz)
+        # Low-CPU sleeps the whole gap; precise sleeps to within SPIN_MARGIN then spins
+        self.precise_sleep = precise_sleep
+        self.clock = clock
+        self.next_tick = clock()
+        self.active = True  # Adaptive mode: something on screen is moving
+
+    def render_fps(self):
+        if self.mode == PACING_CAPPED: return max(30, self.render_cap)
+        if self.mode == PACING_ADAPTIVE and not self.active: return IDLE_FPS
+        return max(60, self.refresh_rate)
+
+    def sleep_until(self, deadline):
+        remaining = deadline - self.clock()
+        if remaining <= 0: return
+        if not self.precise_sleep:
+            time.sleep(remaining); return
+        if remaining > self.SPIN_MARGIN: time.sleep(remaining - self.SPIN_MARGIN)
+        while self.clock() < deadline: pass
+
+    def wait_for_render(self, frame_start, tick):
+        """Run `tick` at the simulation rate until the next render is due."""
+        deadline = frame_start + 1.0 / self.render_fps()
+        while True:
+            now = self.clock()
+            if now >= deadline: return
+            if now >= self.next_tick:
+                tick()
+                self.next_tick += self.sim_interval
+                # After a stall, resume from now instead of bursting through missed ticks
+                if self.next_tick < now: self.next_tick = now + self.sim_interval
+                continue
+            self.sleep_until(min(self.next_tick, deadline))
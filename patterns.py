@@ -0,0 +1,123 @@
+import random
+import threading
+import time
+import queue
+
+# Slot values, as used by PatternSequencer
+REST, DON, KA = 0, 1, 2
+
+DEFAULT_RULES = {
+    "density": 0.6,          # Target fraction of slots holding a note
+    "don_ratio": 0.5,        # Target DON share of the notes
+    "balance_tol": 0.2,      # Max deviation from don_ratio
+    "max_stream": 8,         # Longest run of back-to-back 1/16 notes
+    "max_color_run": 6,      # Longest run of one colour inside a stream
+    "color_repeat": 0.5,     # Markov chain: chance the next note keeps the previous colour
+    "max_hits_per_sec": 20,  # Above this 1/16 rate no two notes may be adjacent
+}
+
+def runs(pattern):
+    """(longest note stream, longest single-colour run inside a stream, leading stream, trailing stream)."""
+    longest = color_longest = cur = color_cur = 0; prev = REST
+    for v in pattern:
+        if v == REST: cur = color_cur = 0
+        else:
+            cur += 1; color_cur = color_cur + 1 if v == prev else 1
+            longest = max(longest, cur); color_longest = max(color_longest, color_cur)
+        prev = v
+    lead = next((i for i, v in enumerate(pattern) if v == REST), len(pattern))
+    tail = next((i for i, v in enumerate(reversed(pattern)) if v == REST), len(pattern))
+    return longest, color_longest, lead, tail
+
+class PatternGenerator:
+    """
+    Produces random patterns ahead of time on a daemon thread. Each pattern is the
+    best of `candidates` Markov-chain samples that pass the rules; finished patterns
+    wait in a bounded queue, so taking one at a loop boundary is a non-blocking get.
+    The worker only runs while the queue has room and yields between small batches,
+    so it stays off the render thread's GIL time most of the loop.
+    """
+    def __init__(self, rules=None, slots=32, prefetch=3, candidates=2000, batch=50, seed=None):
+        self.rules = dict(DEFAULT_RULES); self.rules.update(rules or {})
+        self.slots = slots
+        self.candidates, self.batch = candidates, batch
+        self.rng = random.Random(seed)
+        self.ready = queue.Queue(maxsize=prefetch)
+        self.bpm = 120
+        self.epoch = 0  # Bumped whenever the rules change; older queued patterns are dropped
+        self.fallbacks = 0  # Patterns that had to be generated synchronously
+        self.running = False; self.thread = None
+
+    def max_stream(self):
+        """Stream limit at the current BPM: one note at a time once 1/16s are too fast to play."""
+        if self.bpm * 4 / 60.0 > self.rules["max_hits_per_sec"]: return 1
+        return max(1, self.rules["max_stream"])
+
+    def set_bpm(self, bpm):
+        old = self.max_stream(); self.bpm = bpm
+        if self.max_stream() != old: self.epoch += 1
+
+    def set_rules(self, **rules):
+        self.rules.update(rules); self.epoch += 1
+
+    def sample(self, rng, max_stream):
+        """
+        One Markov-chain candidate: notes at the target density, colour follows
+        color_repeat, and a stream is forced to rest once it reaches `max_stream`.
+        """
+        r = self.rules; pattern = []; color = DON if rng.random() < r["don_ratio"] else KA
+        run, cap = 0, max_stream // 2  # The leading stream has the tighter cap
+        for _ in range(self.slots):
+            if run >= cap or rng.random() >= r["density"]:
+                pattern.append(REST); run = 0; cap = max_stream; continue
+            if rng.random() >= r["color_repeat"]: color = DON if rng.random() < r["don_ratio"] else KA
+            pattern.append(color); run += 1
+        return pattern
+
+    def score(self, pattern, max_stream):
+        """Distance from the targets, or None if the pattern breaks a hard rule."""
+        r = self.rules
+        notes = self.slots - pattern.count(REST)
+        if not notes: return None
+        longest, color_longest, lead, tail = runs(pattern)
+        # Lead and tail are capped separately, so any two patterns can follow each
+        # other (or one can loop) without the seam creating an over-long stream
+        if longest > max_stream or lead > max_stream // 2 or tail > max_stream - max_stream // 2: return None
+        if color_longest > r["max_color_run"]: return None
+        don_frac = pattern.count(DON) / notes
+        if abs(don_frac - r["don_ratio"]) > r["balance_tol"]: return None
+        return abs(notes / self.slots - r["density"]) + abs(don_frac - r["don_ratio"])
+
+    def generate(self, rng, candidates):
+        best, best_score = None, None; max_stream = self.max_stream()
+        for i in range(candidates):
+            pattern = self.sample(rng, max_stream); s = self.score(pattern, max_stream)
+            if s is not None and (best_score is None or s < best_score): best, best_score = pattern, s
+            if self.running and i % self.batch == self.batch - 1: time.sleep(0)
+        return best
+
+    def _worker(self):
+        rng = random.Random(self.rng.random())
+        while self.running:
+            epoch = self.epoch
+            pattern = self.generate(rng, self.candidates)
+            if pattern is None: time.sleep(0.05); continue
+            while self.running and epoch == self.epoch:
+                try: self.ready.put((epoch, pattern), timeout=0.1); break
+                except queue.Full: pass
+
+    def start(self):
+        if self.running: return
+        self.running = True
+        self.thread = threading.Thread(target=self._worker, daemon=True); self.thread.start()
+
+    def stop(self): self.running = False
+
+    def next_pattern(self):
+        """A prefetched pattern if one is ready, else a quick synchronous one."""
+        while True:
+            try: epoch, pattern = self.ready.get_nowait()
+            except queue.Empty: break
+            if epoch == self.epoch: return pattern
+        self.fallbacks += 1
+        return self.generate(self.rng, self.batch) or [REST] * self.slots
@@ -0,0 +1,106 @@
+import time
+import json
+import array
+
+PHASES = ("layout", "events", "update", "lane", "ui", "flip")
+
+class FrameProfiler:
+    """
+    Per-phase frame timer. Each frame's phase durations land in fixed-size ring
+    buffers (array('d') per phase), so memory stays constant however long it runs.
+    'frame' holds the full wall time between frame starts, including the idle wait.
+    """
+    def __init__(self, capacity=2048, clock=time.perf_counter):
+        self.clock = clock
+        self.capacity = capacity
+        self.columns = PHASES + ("frame",)
+        self.samples = {name: array.array('d', bytes(8 * capacity)) for name in self.columns}
+        self.idx = 0; self.count = 0
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.frame_start = None; self.last_mark = None
+        self.overlay = False; self.used = False
+        self.gauges = {}  # Extra live values shown in the overlay, e.g. estimates from other systems
+
+    def begin_frame(self, now=None):
+        now = self.clock() if now is None else now
+        if self.frame_start is not None: self._commit(now)
+        self.frame_start = self.last_mark = now
+
+    def mark(self, phase):
+        """Charge the time since the previous mark to `phase`."""
+        now = self.clock()
+        self.current[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def add(self, phase, seconds):
+        """Charge a separately measured duration to `phase` (e.g. ticks run between frames)."""
+        self.current[phase] += seconds
+
+    def skip(self):
+        """Restart the mark timer without charging the elapsed time to any phase."""
+        self.last_mark = self.clock()
+
+    def _commit(self, now):
+        i = self.idx
+        for phase in PHASES:
+            self.samples[phase][i] = self.current[phase]; self.current[phase] = 0.0
+        self.samples["frame"][i] = now - self.frame_start
+        self.idx = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay; self.used = True
+
+    def set_gauge(self, name, value): self.gauges[name] = value
+
+    def history(self, name):
+        """Samples of one column in chronological order."""
+        buf = self.samples[name]
+        if self.count < self.capacity: return buf[:self.count]
+        return buf[self.idx:] + buf[:self.idx]
+
+    def summary(self):
+        """{column: {p50, p95, p99, worst}} in milliseconds over the buffered frames."""
+        result = {}
+        for name in self.columns:
+            values = sorted(self.history(name))
+            if not values: continue
+            pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+            result[name] = {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "worst": values[-1] * 1000}
+        return result
+
+    def dump(self, base_path="frame_profile"):
+        """Write raw per-frame timings to <base>.csv and the percentile summary to <base>.json."""
+        if not self.count: return
+        try:
+            rows = [self.history(name) for name in self.columns]
+            with open(base_path + ".csv", 'w') as f:
+                f.write(",".join(f"{name}_ms" for name in self.columns) + "\n")
+                for values in zip(*rows): f.write(",".join(f"{v * 1000:.4f}" for v in values) + "\n")
+            with open(base_path + ".json", 'w') as f:
+                json.dump({"frames": self.count, "summary": self.summary(), "gauges": self.gauges}, f, indent=4)
+        except: pass
+
+class StartupTrace:
+    """
+    Milestones of the staged startup, in time since `t0` (set before pygame is
+    imported). Reported once, when the first interactive frame has been presented.
+    """
+    def __init__(self, t0, enabled=False, path="startup_trace.json"):
+        self.t0, self.enabled, self.path = t0, enabled, path
+        self.marks = []; self.done = False
+
+    def mark(self, stage):
+        if self.enabled and not self.done: self.marks.append((stage, time.perf_counter() - self.t0))
+
+    def finish(self):
+        """Record time-to-first-interactive and print/write the trace (windowed builds have no console)."""
+        if self.done: return
+        self.mark("interactive"); self.done = True
+        if not self.enabled: return
+        prev = 0.0
+        for stage, t in self.marks:
+            print(f"[startup] {stage:<12} {t * 1000:8.1f} ms  (+{(t - prev) * 1000:.1f})"); prev = t
+        try:
+            with open(self.path, 'w') as f: json.dump({stage: round(t * 1000, 3) for stage, t in self.marks}, f, indent=4)
+        except: pass
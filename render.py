@@ -0,0 +1,139 @@
+import weakref
+import pygame
+from sprites import SpriteAtlas
+
+try:
+    from pygame._sdl2.video import Window, Renderer, Texture
+except ImportError:
+    Window = Renderer = Texture = None
+
+# The texture backend draws at most this wide and lets the renderer scale to the window
+LOGICAL_MAX_W = 1920
+BLENDMODE_BLEND = 1  # SDL_BLENDMODE_BLEND
+
+class SurfaceCanvas:
+    """
+    Software backend: draw calls go straight to a Surface (the display surface).
+    Anything not defined here is forwarded to the Surface, so it can be passed
+    wherever a Surface is blitted to.
+    """
+    def __init__(self, surface): self.surface = surface
+    def __getattr__(self, name): return getattr(self.surface, name)
+
+    def fill_rect(self, color, rect): pygame.draw.rect(self.surface, color, rect)
+    def line(self, color, start, end, width=1): pygame.draw.line(self.surface, color, start, end, width)
+
+    def fade(self, frames, elapsed, duration):
+        """Pre-baked fade frame for `elapsed`, or None once the fade is over."""
+        i = SpriteAtlas.fade_index(elapsed, duration)
+        return frames[i] if i >= 0 else None
+
+    def layer(self, key, rect, draw, redraw=True, damage=()):
+        """Run draw(surface, origin) for a region; in software that is just the target itself."""
+        draw(self.surface, (0, 0))
+
+class TextureCanvas:
+    """
+    Hardware backend on pygame._sdl2.video (works with SDL's software renderer too).
+    Surfaces passed to blit() are uploaded once and cached as textures for as long
+    as the surface lives; the surface's alpha becomes texture alpha modulation.
+    Regions still drawn with pygame.draw (static panel, sequencer) are kept as
+    layers: a Surface re-uploaded only when redrawn. Drawing happens at a logical
+    size capped to LOGICAL_MAX_W and the renderer scales it to the window, so frame
+    cost barely depends on the window resolution.
+    """
+    def __init__(self, title, size):
+        if Window is None: raise RuntimeError("pygame._sdl2.video is not available")
+        self.window = Window(title, size, resizable=True)
+        self.renderer = Renderer(self.window, accelerated=-1, vsync=False)
+        self.textures = weakref.WeakKeyDictionary()
+        self.alpha = weakref.WeakKeyDictionary()  # Alpha set by fade(), overriding the surface's own
+        self.layers = {}  # key -> (Surface, streaming Texture)
+        self.size = None; self.fullscreen = False
+        self.update_size()
+
+    def update_size(self):
+        """Logical size for the current window size; call once per frame."""
+        w, h = self.window.size
+        scale = min(1.0, LOGICAL_MAX_W / max(1, w))
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        if size != self.size: self.size = size; self.renderer.logical_size = size
+        return size
+
+    def get_size(self): return self.size
+    def get_width(self): return self.size[0]
+    def get_height(self): return self.size[1]
+    def get_rect(self): return pygame.Rect((0, 0), self.size)
+
+    def texture(self, surface):
+        tex = self.textures.get(surface)
+        if tex is None: tex = self.textures[surface] = Texture.from_surface(self.renderer, surface)
+        return tex
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        tex = self.texture(source)
+        alpha = self.alpha.get(source)
+        if alpha is None: alpha = source.get_alpha()
+        tex.alpha = 255 if alpha is None else alpha
+        x, y = int(dest[0]), int(dest[1])
+        if area is None: tex.draw(dstrect=(x, y, source.get_width(), source.get_height()))
+        else:
+            area = pygame.Rect(area); tex.draw(srcrect=area, dstrect=(x, y, area.w, area.h))
+
+    def blits(self, blit_sequence, doreturn=True):
+        for source, dest in blit_sequence: self.blit(source, dest)
+
+    def fill_rect(self, color, rect):
+        self.renderer.draw_color = pygame.Color(color); self.renderer.fill_rect(pygame.Rect(rect))
+
+    def line(self, color, start, end, width=1):
+        if width <= 1:
+            self.renderer.draw_color = pygame.Color(color); self.renderer.draw_line(start, end); return
+        # Thick lines are only ever vertical/horizontal here: draw them as rects
+        (x0, y0), (x1, y1) = start, end
+        if x0 == x1: self.fill_rect(color, (x0 - width // 2, min(y0, y1), width, abs(y1 - y0) + 1))
+        else: self.fill_rect(color, (min(x0, x1), y0 - width // 2, abs(x1 - x0) + 1, width))
+
+    def fade(self, frames, elapsed, duration):
+        """First (opaque) frame with the fade applied by the renderer as alpha, or None once over."""
+        if elapsed < 0 or elapsed >= duration: return None
+        self.alpha[frames[0]] = int(255 * (1.0 - elapsed / duration))
+        return frames[0]
+
+    def layer(self, key, rect, draw, redraw=True, damage=()):
+        """
+        Draw a software-drawn region: draw(surface, origin) runs only when `redraw`, then it's uploaded.
+        Without `redraw`, only the `damage` rects (layer coordinates) are redrawn and uploaded.
+        """
+        rect = pygame.Rect(rect)
+        entry = self.layers.get(key)
+        if entry is None or entry[0].get_size() != rect.size:
+            surf = pygame.Surface(rect.size, pygame.SRCALPHA)
+            tex = Texture(self.renderer, rect.size, streaming=True); tex.blend_mode = BLENDMODE_BLEND
+            entry = self.layers[key] = (surf, tex); redraw = True
+        surf, tex = entry
+        if redraw:
+            surf.fill((0, 0, 0, 0)); draw(surf, rect.topleft); tex.update(surf)
+        else:
+            for r in damage:
+                r = surf.get_rect().clip(r)
+                if not r: continue
+                surf.set_clip(r); surf.fill((0, 0, 0, 0)); draw(surf, rect.topleft); surf.set_clip(None)
+                tex.update(surf.subsurface(r), area=r)
+        tex.draw(dstrect=rect)
+
+    def begin(self, color):
+        self.renderer.draw_color = pygame.Color(color); self.renderer.clear()
+
+    def present(self): self.renderer.present()
+
+    def present_surface(self, surface):
+        """Show a whole software-drawn frame (e.g. the splash), scaled to the window."""
+        self.renderer.draw_color = (0, 0, 0, 255); self.renderer.clear()
+        Texture.from_surface(self.renderer, surface).draw(dstrect=(0, 0, *self.size))
+        self.renderer.present()
+
+    def toggle_fullscreen(self):
+        self.fullscreen = not self.fullscreen
+        if self.fullscreen: self.window.set_fullscreen(desktop=True)
+        else: self.window.set_windowed()
@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import threading
+from engine import TrainerEngine
+
+REPLAY_DIR = "replays"
+TRACKED = ("bpm", "offset", "auto_play", "lookahead_time")
+
+class InputRecorder:
+    """
+    Records what TrainerEngine needs to reproduce a session: key presses with their
+    stamps (and the tick they were judged after), BPM/offset/speed changes, tempo
+    ramps and every compiled loop. Attach as engine.recorder; each session is written to its own
+    JSON file when it stops or a new one starts. Every time in the file, payloads
+    included, is relative to the session start (see rel()). Only game-mode sessions
+    are recorded, and sessions without a single hit are not written.
+    """
+    def __init__(self, directory=REPLAY_DIR):
+        self.directory = directory
+        self.events = []; self.state = {}
+        self.origin = 0.0; self.last_tick = 0.0
+        self.active = False  # Recording the current session
+        self.saved = []  # Paths written so far
+        self.writer = None  # Thread of the last save
+
+    def session(self, engine):
+        if self.events: self.save()
+        self.origin = self.last_tick = engine.session_start
+        # Visualizer sessions have nothing to re-judge
+        self.active = engine.game_mode
+        if not self.active: return
+        self.state = {name: getattr(engine, name) for name in TRACKED}
+        header = dict(self.state, delay=engine.start_time - engine.session_start, slots=engine.slots, game_mode=engine.game_mode)
+        self.record(engine.session_start, "start", header)
+
+    def rel(self, t):
+        """Engine time -> recording time; use it for times inside payloads."""
+        return t - self.origin
+
+    def record(self, t, kind, value=None):
+        if not self.active: return
+        self.events.append((t - self.origin, kind, value))
+        if kind == "stop": self.save()
+
+    def track(self, t, engine):
+        """Record any tracked engine attribute that changed since the last call."""
+        if not self.active: return
+        for name in TRACKED:
+            value = getattr(engine, name)
+            if self.state.get(name) != value: self.state[name] = value; self.record(t, name, value)
+
+    def save(self, wait=False):
+        """Write the current session on a background thread (or inline with wait=True)."""
+        # A session that was started and reset without playing isn't worth a file
+        if not any(kind == "hit" for _, kind, _ in self.events): self.events = []; return None
+        path = os.path.join(self.directory, time.strftime("session_%Y%m%d_%H%M%S") + f"_{len(self.saved)}.json")
+        data = {"version": 1, "events": self.events}; self.events = []
+        self.saved.append(path)
+        thread = self.writer = threading.Thread(target=self._write, args=(path, data), daemon=True); thread.start()
+        if wait: thread.join()
+        return path
+
+    def _write(self, path, data):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, 'w') as f: json.dump(data, f)
+        except: pass
+
+def load_recording(path):
+    with open(path, 'r') as f: return json.load(f)
+
+def replay(recording, windows=None, offset=None, engine=None):
+    """
+    Re-run a recorded session through the judgment logic as fast as possible.
+    `windows` (perfect, ok, bad) and `offset` override the recorded values.
+    Returns the engine, whose stats/max_combo hold the result.
+    """
+    events = recording["events"]
+    header = events[0][2] if events and events[0][1] == "start" else {}
+    engine = engine or TrainerEngine(clock=lambda: 0.0, slots=header.get("slots", 32))
+    engine.auto_compile = False
+    if windows: engine.windows = tuple(windows)
+    for t, kind, value in events:
+        if kind == "start":
+            for name in TRACKED: setattr(engine, name, value[name])
+            engine.game_mode = value["game_mode"]
+            engine.start(value["delay"], now=t)
+            if offset is not None: engine.offset = offset
+        elif kind == "hit":
+            # Advance to the tick the live engine had reached, then judge at the stamp
+            engine.advance(value[1]); engine.feed_input(value[0], t)
+        elif kind == "loop":
+            engine.advance(t); engine.compile_loop(*value)
+        elif kind == "measure":
+            engine.advance(t); engine.compile_measure(*value)
+        elif kind == "stop":
+            engine.advance(t); engine.stop()
+        elif kind == "ramp": engine.ramp_to(t, *value)
+        elif kind == "offset" and offset is not None: continue
+        else:
+            setattr(engine, kind, value)
+            if kind == "bpm": engine.sync_tempo(t)
+    return engine
+
+def rescore(paths, windows=None, offset=None):
+    """[(path, stats, max_combo)] for each recording under the given windows/offset."""
+    results = []
+    for path in paths:
+        engine = replay(load_recording(path), windows, offset)
+        results.append((path, dict(engine.stats), engine.max_combo))
+    return results
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Re-score recorded sessions.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--windows", nargs=3, type=float, metavar=("PERFECT", "OK", "BAD"))
+    parser.add_argument("--offset", type=float)
+    args = parser.parse_args()
+    t0 = time.perf_counter(); results = rescore(args.paths, args.windows, args.offset)
+    for path, stats, max_combo in results:
+        print(f"{os.path.basename(path)}: " + " ".join(f"{k}={v}" for k, v in stats.items()) + f" max_combo={max_combo}")
+    print(f"{len(results)} session(s) in {time.perf_counter() - t0:.3f}s", file=sys.stderr)
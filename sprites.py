@@ -0,0 +1,69 @@
+import pygame
+
+# Fade timings (seconds) and how many pre-baked alpha steps cover them
+GLOW_DURATION, FLASH_DURATION = 0.15, 0.1
+FADE_FRAMES = 16
+
+def prepared(surface, alpha=False):
+    """convert()/convert_alpha() for fast blits; unchanged without a display surface (texture backend)."""
+    if pygame.display.get_surface() is None: return surface
+    return surface.convert_alpha() if alpha else surface.convert()
+
+class SpriteAtlas:
+    """
+    Pre-baked lane sprites: notes, receptor ring, hit line and the alpha-faded
+    glow/flash frames. Built once per NOTE_R / lane height / window size so the
+    render loop never allocates surfaces or calls pygame.draw for the lane.
+    """
+    def __init__(self, note_r, bar_h, screen_size, note_colors, ring_col=(200, 200, 200), line_col=(255, 255, 255)):
+        self.key = (note_r, bar_h, screen_size)
+        self.note_r = note_r
+        self.note_colors = note_colors
+        r = note_r
+
+        self.notes = {}
+        for note_type, col in note_colors.items():
+            # Colorkeyed + RLE: opaque circles blit much faster than per-pixel alpha
+            s = pygame.Surface((r * 2, r * 2)); s.fill((255, 0, 255)); s.set_colorkey((255, 0, 255), pygame.RLEACCEL)
+            pygame.draw.circle(s, (255, 255, 255), (r, r), r)
+            pygame.draw.circle(s, col, (r, r), int(r * 0.9))
+            self.notes[note_type] = prepared(s)
+
+        self.ring = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+        pygame.draw.circle(self.ring, ring_col, (r, r), r, 4)
+        self.ring = prepared(self.ring, True)
+
+        # Hit line in both thicknesses (visualizer 4px, game 2px), 20px overhang each side
+        self.hit_lines = {}
+        for w in (2, 4):
+            s = pygame.Surface((w, bar_h + 40)); s.fill(line_col)
+            self.hit_lines[w] = prepared(s)
+
+        self.glow = {}
+        self.flash = {}
+        for note_type, col in note_colors.items():
+            self.glow[col] = self._bake_glow(col)
+            self.flash[note_type] = self._bake_fade((r * 2, r * 2), col, 150, (r, r), r)
+
+    def _bake_fade(self, size, col, max_alpha, center, radius):
+        frames = []
+        for i in range(FADE_FRAMES):
+            s = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.draw.circle(s, (*col, int(max_alpha * (1.0 - i / FADE_FRAMES))), center, radius)
+            frames.append(prepared(s, True))
+        return frames
+
+    def _bake_glow(self, col):
+        r = self.note_r
+        return self._bake_fade((int(r * 5), int(r * 5)), col, 180, (r * 2.5, r * 2.5), r * 1.8)
+
+    @staticmethod
+    def fade_index(elapsed, duration):
+        """Quantize elapsed time into a fade frame index, or -1 once the fade is over."""
+        if elapsed < 0 or elapsed >= duration: return -1
+        return int(elapsed / duration * FADE_FRAMES)
+
+    def glow_frames(self, col):
+        frames = self.glow.get(col)
+        if frames is None: frames = self.glow[col] = self._bake_glow(col)
+        return frames
@@ -0,0 +1,99 @@
+import math
+from bisect import bisect_right
+
+MIN_BPM = 1.0  # Slowest tempo a segment can be set to; only hold() stops the beat
+
+class TempoMap:
+    """
+    Piecewise tempo curve. Each segment starts at a time and beat position with a
+    BPM and a slope (BPM per second, 0 for a constant tempo). Segment start beats
+    are prefix sums of the segments before them, so time->beat and beat->time are
+    a binary search plus a closed-form step. Tempo changes append segments, so
+    the beats already played never move.
+    """
+    def __init__(self, start_time, bpm):
+        self.times = [start_time]; self.beats = [0.0]
+        self.bpms = [float(max(MIN_BPM, bpm))]; self.slopes = [0.0]
+
+    @property
+    def target(self):
+        """Tempo the map settles at (the last segment is always constant)."""
+        return self.bpms[-1]
+
+    def _segment(self, t):
+        return max(0, bisect_right(self.times, t) - 1)
+
+    def beat_at(self, t):
+        i = self._segment(t); dt = t - self.times[i]
+        return self.beats[i] + (self.bpms[i] + self.slopes[i] * dt / 2) * dt / 60.0
+
+    def bpm_at(self, t):
+        i = self._segment(t)
+        return self.bpms[i] + self.slopes[i] * max(0.0, t - self.times[i])
+
+    def time_at(self, beat):
+        i = max(0, bisect_right(self.beats, beat) - 1)
+        db = (beat - self.beats[i]) * 60.0; b0, k = self.bpms[i], self.slopes[i]
+        if k == 0: return self.times[i] + db / b0
+        # Solve beat(dt) for dt on the ramp: k/2 dt^2 + b0 dt - db = 0
+        return self.times[i] + (math.sqrt(max(0.0, b0 * b0 + 2 * k * db)) - b0) / k
+
+    def _append(self, t, bpm, slope):
+        if t <= self.times[0]:
+            # Still before the first beat: just retune the opening segment
+            self.bpms[0], self.slopes[0] = float(bpm), slope
+            del self.times[1:], self.beats[1:], self.bpms[1:], self.slopes[1:]; return
+        # A change overrides whatever was planned from `t` on (e.g. the rest of a ramp)
+        while self.times[-1] >= t: self.times.pop(); self.beats.pop(); self.bpms.pop(); self.slopes.pop()
+        beat = self.beat_at(t)
+        self.times.append(t); self.beats.append(beat); self.bpms.append(float(bpm)); self.slopes.append(slope)
+
+    def set_bpm(self, t, bpm):
+        """Constant `bpm` from time `t` on, clamped to MIN_BPM."""
+        self._append(t, max(MIN_BPM, bpm), 0.0)
+
+    def hold(self, t):
+        """Stop the beat at `t` (a chart #DELAY) until the next set_bpm(), which must follow."""
+        self._append(t, 0.0, 0.0)
+
+    def ramp(self, t, bpm_to, duration):
+        """Linear ramp from the tempo at `t` to `bpm_to` over `duration` seconds, then hold."""
+        bpm_to = max(MIN_BPM, bpm_to)
+        if duration <= 0: self.set_bpm(t, bpm_to); return
+        b_from = self.bpm_at(t)
+        self._append(t, b_from, (bpm_to - b_from) / duration)
+        self._append(t + duration, bpm_to, 0.0)
+
+    def prune(self, before):
+        """Drop segments that ended before `before`; the map stays exact from there on."""
+        i = self._segment(before)
+        if i > 0: del self.times[:i], self.beats[:i], self.bpms[:i], self.slopes[:i]
+
+class SpeedTrainer:
+    """
+    Raises the tempo by `step` BPM, ramped over `ramp_loops` loops, after every
+    `clean_loops` consecutive loops without a BAD or MISS. Only game-mode loops the
+    player actually hit notes in count; autoplay judgments are ignored.
+    """
+    def __init__(self, clean_loops=4, step=5, max_bpm=400, ramp_loops=1):
+        self.clean_loops, self.step, self.max_bpm, self.ramp_loops = clean_loops, step, max_bpm, ramp_loops
+        self.enabled = True
+        self.reset()
+
+    def reset(self):
+        self.clean = 0; self.loop_clean = True; self.loop_hits = 0
+
+    def judged(self, judgment, is_auto=False):
+        if is_auto: return
+        self.loop_hits += 1
+        if judgment in ("BAD", "MISS"): self.loop_clean = False
+
+    def loop_done(self, engine, now):
+        played = engine.game_mode and self.loop_hits
+        if played: self.clean = self.clean + 1 if self.loop_clean else 0
+        self.loop_clean = True; self.loop_hits = 0
+        if not played: return
+        if not self.enabled or self.clean < self.clean_loops or engine.bpm >= self.max_bpm: return
+        self.clean = 0
+        loop_sec = engine.slots / 4 * 60.0 / engine.bpm
+        engine.ramp_to(now, min(self.max_bpm, engine.bpm + self.step), loop_sec * self.ramp_loops)
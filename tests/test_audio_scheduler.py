@@ -0,0 +1,41 @@
+from array import array
+from audio import AudioScheduler
+
+SAMPLE_RATE, CHANNELS, CHUNK = 44100, 2, 512
+VOICES = {"a": array('h', [1000] * (300 * CHANNELS)), "b": array('h', [-700] * (50 * CHANNELS))}
+
+def make_scheduler():
+    sched = AudioScheduler(VOICES.get, SAMPLE_RATE, CHANNELS, CHUNK, clock=lambda: 0.0)
+    sched.t0 = 0.0
+    return sched
+
+def test_onsets_are_sample_exact():
+    """Onsets across chunk boundaries, overlapping voices and the time -> frame path."""
+    sched = make_scheduler()
+    onsets = [("a", 100), ("b", 250), ("a", 500), ("b", 511), ("a", 512), ("b", 1023), ("a", 2000)]
+    for name, frame in onsets[:-1]: sched.schedule_frame(name, frame)
+    name, frame = onsets[-1]; sched.schedule(name, frame / SAMPLE_RATE)
+    total = 3 * CHUNK + 1024
+    expected = [0] * (total * CHANNELS)
+    for name, frame in onsets:
+        v = VOICES[name]
+        for i in range(len(v)):
+            j = frame * CHANNELS + i
+            if j < len(expected): expected[j] = max(-32768, min(32767, expected[j] + v[i]))
+    stream = array('h')
+    for _ in range(total // CHUNK): stream.extend(sched.render())
+    assert list(stream) == expected[:len(stream)]
+
+def test_late_event_plays_at_chunk_start():
+    sched = make_scheduler()
+    sched.render()
+    sched.schedule_frame("a", 0); late = sched.render()
+    assert late[0] == 1000 and sched.late_events == 1
+
+def test_events_wait_for_the_stream_anchor():
+    """Scheduled before the feeder sets t0, an event still plays at its own time."""
+    sched = AudioScheduler(VOICES.get, SAMPLE_RATE, CHANNELS, CHUNK, clock=lambda: 0.0)
+    sched.schedule("a", 10.0 + 700 / SAMPLE_RATE)
+    sched.anchor(10.0)
+    stream = sched.render() + sched.render()
+    assert stream[700 * CHANNELS - 1] == 0 and stream[700 * CHANNELS] == 1000 and sched.late_events == 0
@@ -0,0 +1,30 @@
+import time
+from inputs import ControllerInput, LatencyMeter, VirtualMidiInput
+
+def test_virtual_midi_hits_keep_lane_and_stamp(hits=40, spacing=0.01):
+    """Injected note-ons come back bound to the right lane, stamped within the device clock's 1 ms resolution."""
+    controllers = ControllerInput({"don_l": "midi:38", "ka_l": "midi:40"})
+    device = VirtualMidiInput(); controllers.add_midi(device, "virtual", device.time)
+    t0 = time.perf_counter() + 0.02
+    sent = [(t0 + i * spacing, 38 if i % 3 else 40) for i in range(hits)]
+    for at, note in sent: device.inject(note, 100, at)
+    got = []; deadline = sent[-1][0] + 0.5
+    while len(got) < hits and time.perf_counter() < deadline:
+        got.extend(controllers.drain_midi()); time.sleep(0.001)
+    controllers.stop()
+    assert len(got) == hits
+    assert max(abs(g[0] - at) for g, (at, _) in zip(got, sent)) <= 0.0015
+    assert [controllers.lane(g[1]) for g in got] == ['DON' if note == 38 else 'KA' for _, note in sent]
+
+def test_latency_meter_tracks_its_window():
+    meter = LatencyMeter(history=4)
+    for latency in [0.009, 0.002, 0.003, 0.001, 0.004, 0.002]: meter.add("pad", latency)
+    mean, worst = meter.summary()["pad"]
+    assert abs(mean - 0.0025) < 1e-12 and worst == 0.004
+
+def test_lost_midi_device_stops_its_poller():
+    class Unplugged:
+        def poll(self): raise OSError("device removed")
+    poller = ControllerInput({}).add_midi(Unplugged(), "pad", lambda: 0)
+    poller.thread.join(timeout=1.0)
+    assert not poller.running and isinstance(poller.error, OSError)
@@ -0,0 +1,62 @@
+import os
+import heapq
+import random
+from engine import TrainerEngine
+from replay import InputRecorder, load_recording, replay
+from chart import load_chart, ChartTimeline
+
+# Two measures with a tempo change, a 7/8 bar and a delay, looped
+REPLAY_CHART = """TITLE:Replay check
+BPM:150
+COURSE:Oni
+#START
+1020102011201120,
+#BPMCHANGE 180
+#MEASURE 7/8
+10201021020102,
+#DELAY 0.05
+3040,
+#END
+"""
+
+def play_session(directory, seconds=20.0, t0=5000.0, tick=0.001, chart_text=None):
+    """
+    Play a session (or a looped chart) on a clock that starts far from zero (like perf_counter) with
+    jittered and stray hits and a BPM change halfway, and save it. Returns the
+    engine and the path of the recording.
+    """
+    now = t0; rng = random.Random(0); pending = []; seen = set()
+    engine = TrainerEngine(clock=lambda: now, pattern_source=lambda: [1, 2, 1, 1, 0, 2, 1, 0] * 4)
+    engine.bpm = 150; engine.lookahead_time = 1.5
+    if chart_text:
+        path = os.path.join(directory, "check.tja")
+        with open(path, 'w') as f: f.write(chart_text)
+        engine.chart = ChartTimeline(load_chart(path, cache_dir=directory))
+    recorder = engine.recorder = InputRecorder(directory)
+    engine.start(0.5, now=now)
+    while now < t0 + seconds:
+        now += tick
+        # Like sim_tick: input stamped since the last tick is judged before advancing
+        while pending and pending[0][0] <= now:
+            stamp, lane = heapq.heappop(pending); engine.feed_input(lane, stamp)
+        if now >= t0 + seconds / 2: engine.bpm = 165
+        engine.advance(now)
+        for note in engine.visible_notes(now, now + 0.2):
+            if note in seen: continue
+            seen.add(note)
+            if rng.random() < 0.9: heapq.heappush(pending, (max(now, note.time + rng.gauss(0, 0.03)), note.type))
+        if rng.random() < 0.002: heapq.heappush(pending, (now + tick / 2, rng.choice(('DON', 'KA'))))
+    engine.stop(); recorder.writer.join()
+    return engine, recorder.saved[-1]
+
+def test_replay_matches_live_run(tmp_path):
+    engine, path = play_session(str(tmp_path))
+    replayed = replay(load_recording(path))
+    assert engine.stats["good"] > 0
+    assert (replayed.stats, replayed.max_combo) == (engine.stats, engine.max_combo)
+
+def test_chart_replay_matches_live_run(tmp_path):
+    engine, path = play_session(str(tmp_path), chart_text=REPLAY_CHART)
+    replayed = replay(load_recording(path))
+    assert engine.stats["good"] > 0
+    assert (replayed.stats, replayed.max_combo) == (engine.stats, engine.max_combo)
@@ -0,0 +1,22 @@
+from tempo import MIN_BPM, TempoMap
+from chart import build_index, ChartIndex
+
+def test_non_positive_bpm_is_clamped():
+    tempo = TempoMap(0.0, 120)
+    tempo.set_bpm(1.0, 0); tempo.ramp(2.0, -30, 1.0)
+    assert tempo.target == MIN_BPM and tempo.time_at(10.0) > 3.0
+
+def test_hold_stops_the_beat_until_the_next_segment():
+    tempo = TempoMap(0.0, 120)
+    tempo.hold(1.0); tempo.set_bpm(1.5, 120)
+    assert tempo.beat_at(1.25) == tempo.beat_at(1.0) == 2.0
+    assert tempo.time_at(2.0) == 1.5 and tempo.time_at(3.0) == 2.0
+
+def test_chart_rejects_zero_bpm_changes(tmp_path):
+    tja = tmp_path / "zero.tja"
+    tja.write_text("BPM:0\nCOURSE:Oni\n#START\n1000,\n#BPMCHANGE 0\n1000,\n#BPMCHANGE -90\n1000,\n#END\n")
+    build_index(str(tja), str(tmp_path / "zero.idx"))
+    index = ChartIndex(str(tmp_path / "zero.idx"))
+    assert index.initial_bpm > 0 and all(index.measure(i)[0] > 0 for i in range(len(index)))
+    assert all(value > 0 for i in range(len(index)) for _, _, value in index.measure(i)[4])
+    index.close()
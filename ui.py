@@ -1,8 +1,110 @@
 import pygame
+import os
+import json
+from collections import OrderedDict
+
+FONT_CACHE_FILE = "font_cache.json"
 
 def init_font():
     pygame.font.init()
 
+class FontRegistry:
+    """
+    Process-wide font registry. Each (family, size, bold) is resolved once and the
+    same Font object is handed out to every widget. Resolved font file paths are
+    persisted so later launches skip the system font enumeration done by SysFont.
+    """
+    def __init__(self, cache_file=FONT_CACHE_FILE):
+        self.cache_file = cache_file
+        self.fonts = {}
+        self.paths = None  # "family|bold" -> [path or None, synthetic bold]
+        self.dirty = False
+
+    def _load_paths(self):
+        self.paths = {}
+        if not os.path.exists(self.cache_file): return
+        try:
+            with open(self.cache_file, 'r') as f: self.paths = json.load(f)
+        except: self.paths = {}
+
+    def _resolve(self, family, bold):
+        if self.paths is None: self._load_paths()
+        key = f"{family}|{int(bold)}"
+        entry = self.paths.get(key)
+        if entry is None or (entry[0] and not os.path.exists(entry[0])):
+            path = pygame.font.match_font(family, bold=bold)
+            # SysFont fakes bold when the family has no bold face
+            synth_bold = bold and (path is None or path == pygame.font.match_font(family))
+            entry = self.paths[key] = [path, synth_bold]
+            self.dirty = True
+        return entry
+
+    def preload(self, specs):
+        """Resolve font files for [(family, bold), ...] ahead of time (e.g. on a loader thread)."""
+        for family, bold in specs: self._resolve(family, bold)
+
+    def get(self, family, size, bold=False):
+        key = (family, size, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            path, synth_bold = self._resolve(family, bold)
+            try: font = pygame.font.Font(path, size)
+            except: font = pygame.font.Font(None, size); synth_bold = bold
+            if synth_bold: font.set_bold(True)
+            self.fonts[key] = font
+        return font
+
+    def save(self):
+        if not self.dirty: return
+        try:
+            with open(self.cache_file, 'w') as f: json.dump(self.paths, f, indent=4)
+            self.dirty = False
+        except: pass
+
+font_registry = FontRegistry()
+
+def get_font(family, size, bold=False):
+    """Shared Font for (family, size, bold); use instead of pygame.font.SysFont."""
+    return font_registry.get(family, size, bold)
+
+class TextCache:
+    """
+    Shared LRU cache of rendered text surfaces, keyed by (font, text, antialias, color).
+    Most UI strings never change between frames, so this skips the FreeType
+    rasterization that font.render() would otherwise repeat every frame.
+    """
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0; self.misses = 0
+
+    def __len__(self): return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def render(self, font, text, antialias, color):
+        key = (font, text, antialias, tuple(color))
+        surf = self.entries.get(key)
+        if surf is not None:
+            self.hits += 1; self.entries.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = self.entries[key] = font.render(text, antialias, color)
+        if len(self.entries) > self.max_size: self.entries.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.entries.clear(); self.hits = 0; self.misses = 0
+
+text_cache = TextCache()
+
+def render_text(font, text, antialias, color):
+    """Cached drop-in for font.render(). The returned surface is shared: do not modify it."""
+    return text_cache.render(font, text, antialias, color)
+
 class Button:
     """Standard UI button with hover effects and text override."""
     def __init__(self, x, y, w, h, text, callback):
@@ -10,7 +112,7 @@ class Button:
         self.text = text
         self.text_override = None
         self.callback = callback
-        self.font = pygame.font.SysFont("Arial", 16, bold=True)
+        self.font = get_font("Arial", 16, bold=True)
         self.hovered = False
 
     def handle_event(self, event):
@@ -26,7 +128,7 @@ class Button:
         pygame.draw.rect(screen, color, self.rect, border_radius=5)
         pygame.draw.rect(screen, (200, 200, 200), self.rect, 1, border_radius=5)
         display_text = self.text_override if self.text_override else self.text
-        txt_surf = self.font.render(display_text, True, (255, 255, 255))
+        txt_surf = render_text(self.font, display_text, True, (255, 255, 255))
         screen.blit(txt_surf, txt_surf.get_rect(center=self.rect.center))
 
 class Checkbox:
@@ -36,7 +138,7 @@ class Checkbox:
         self.label = label
         self.val = initial_val
         self.callback = callback
-        self.font = pygame.font.SysFont("Arial", 16, bold=True)
+        self.font = get_font("Arial", 16, bold=True)
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and self.rect.collidepoint(event.pos):
@@ -49,7 +151,7 @@ class Checkbox:
         pygame.draw.rect(screen, (70, 70, 70), self.rect, border_radius=3)
         if self.val:
             pygame.draw.rect(screen, (50, 200, 50), self.rect.inflate(-6, -6), border_radius=2)
-        txt = self.font.render(self.label, True, (255, 255, 255))
+        txt = render_text(self.font, self.label, True, (255, 255, 255))
         screen.blit(txt, (self.rect.right + 10, self.rect.y))
 
 class JudgmentText:
@@ -58,14 +160,16 @@ class JudgmentText:
         self.text = text
         self.color = color
         self.start_time = time.perf_counter()
-        self.font = pygame.font.SysFont("Arial", 36, bold=True)
+        self.font = get_font("Arial", 36, bold=True)
+        # Private copy of the cached surface, since its alpha is changed while fading
+        self.surf = render_text(self.font, self.text, True, self.color).copy()
 
     def draw(self, screen, x, y):
         elapsed = time.perf_counter() - self.start_time
         if elapsed > 0.4: return
         alpha = int(255 * (1.0 - elapsed / 0.4))
         # Surface with alpha requires a bit more effort in raw Pygame
-        surf = self.font.render(self.text, True, self.color)
+        surf = self.surf
         surf.set_alpha(alpha)
         screen.blit(surf, (x - surf.get_width()//2, y - 100 - (elapsed * 100)))
 
@@ -78,7 +182,7 @@ class Slider:
         self.min_val, self.max_val, self.val = min_val, max_val, initial_val
         self.label, self.callback = label, callback
         self.grabbed = False
-        self.font = pygame.font.SysFont("Arial", 16, bold=True)
+        self.font = get_font("Arial", 16, bold=True)
         self.handle_rect = pygame.Rect(0, 0, 12, 30)
         self.update_handle_pos()
 
@@ -93,7 +197,7 @@ class Slider:
         pygame.draw.rect(screen, (80, 80, 80), self.rect, border_radius=5)
         pygame.draw.rect(screen, (200, 200, 200), self.handle_rect, border_radius=3)
         v_str = f"{int(self.val)}" if self.max_val > 1 else f"{round(self.val, 3)}"
-        txt = self.font.render(f"{self.label}: {v_str}", True, (255, 255, 255))
+        txt = render_text(self.font, f"{self.label}: {v_str}", True, (255, 255, 255))
         screen.blit(txt, (self.rect.x, self.rect.y - 25))
 
     def handle_event(self, event):
@@ -106,18 +210,44 @@ class Slider:
             self.update_handle_pos(); self.callback(self.val); return True
         return False
 
+    def hit_rect(self):
+        # The handle overhangs the track by half its size on every side
+        return self.rect.inflate(self.handle_rect.w, self.handle_rect.h)
+
 class Dropdown:
-    """Collapsible menu for selecting from a list of options."""
-    def __init__(self, x, y, w, h, main_text, options, callback):
+    """
+    Collapsible menu for selecting from a list of options. The option buttons are
+    only built the first time the menu opens; until then the option area is
+    computed from the option count.
+    """
+    def __init__(self, x, y, w, h, main_text, options, callback, open_up=False):
         self.main_btn = Button(x, y, w, h, main_text, self.toggle)
         self.options, self.callback = options, callback
+        self.open_up = open_up
         self.is_open = False
-        self.option_buttons = []
-        for i, opt in enumerate(options):
-            btn = Button(x, y + (i + 1) * h, w, h, opt["name"], lambda o=opt: self.select(o))
-            self.option_buttons.append(btn)
+        self.option_buttons = None
+
+    def options_rect(self):
+        r = self.main_btn.rect; n = len(self.options)
+        return pygame.Rect(r.x, r.y - n * r.h if self.open_up else r.bottom, r.w, n * r.h)
+
+    def place_options(self):
+        """Move the option buttons (if built) next to the main button."""
+        if self.option_buttons is None: return
+        r = self.main_btn.rect; top = self.options_rect().y
+        for i, btn in enumerate(self.option_buttons): btn.rect.topleft = (r.x, top + i * r.h)
 
-    def toggle(self): self.is_open = not self.is_open
+    def hit_rect(self): return self.main_btn.rect.union(self.options_rect())
+    def hit_test(self, pos):
+        if self.main_btn.rect.collidepoint(pos): return True
+        return self.is_open and self.options_rect().collidepoint(pos)
+
+    def toggle(self):
+        self.is_open = not self.is_open
+        if self.is_open and self.option_buttons is None:
+            r = self.main_btn.rect
+            self.option_buttons = [Button(0, 0, r.w, r.h, opt["name"], lambda o=opt: self.select(o)) for opt in self.options]
+            self.place_options()
     def select(self, option): self.callback(option); self.is_open = False
 
     def handle_event(self, event):
@@ -131,4 +261,79 @@ class Dropdown:
     def draw(self, screen):
         self.main_btn.draw(screen)
         if self.is_open:
-            for btn in self.option_buttons: btn.draw(screen)
\ No newline at end of file
+            for btn in self.option_buttons: btn.draw(screen)
+
+
+MOUSE_EVENTS = (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP)
+
+class WidgetTree:
+    """
+    Retained widget list with cached layout and spatial mouse dispatch.
+    `layout` positions every widget and only runs when the layout key (e.g. window
+    size and mode) changes. Widget bounds are then bucketed into a coarse grid, so
+    a mouse event only reaches the topmost visible widget under the cursor instead
+    of being offered to every control.
+    Widgets need handle_event(); bounds come from hit_rect() or .rect, and an
+    optional hit_test(pos) refines the bounds (e.g. a closed dropdown's options).
+    """
+    def __init__(self, layout, cell=64):
+        self.layout = layout
+        self.cell = cell
+        self.widgets = []  # (widget, visible predicate) in paint order; later entries are on top
+        self.grid = {}
+        self.layout_key = None
+        self.hovered = None; self.captured = None
+
+    def add(self, widget, visible=None):
+        self.widgets.append((widget, visible)); self.invalidate()
+        return widget
+
+    def invalidate(self): self.layout_key = None
+
+    @staticmethod
+    def bounds(widget): return widget.hit_rect() if hasattr(widget, "hit_rect") else widget.rect
+
+    def update_layout(self, key):
+        """Re-run the layout and rebuild the grid if `key` differs from the cached one."""
+        if key == self.layout_key: return False
+        self.layout(); self.layout_key = key
+        self.grid = {}; c = self.cell
+        for order, (widget, visible) in enumerate(self.widgets):
+            r = self.bounds(widget)
+            for gx in range(r.left // c, (r.right - 1) // c + 1):
+                for gy in range(r.top // c, (r.bottom - 1) // c + 1):
+                    self.grid.setdefault((gx, gy), []).append(order)
+        return True
+
+    def widget_at(self, pos):
+        cell = self.grid.get((pos[0] // self.cell, pos[1] // self.cell))
+        if not cell: return None
+        for order in reversed(cell):
+            widget, visible = self.widgets[order]
+            if visible and not visible(): continue
+            if hasattr(widget, "hit_test"):
+                if widget.hit_test(pos): return widget
+            elif self.bounds(widget).collidepoint(pos): return widget
+        return None
+
+    def dispatch(self, event):
+        """Route a mouse event to the widget under the cursor. Returns True if it was consumed."""
+        if event.type not in MOUSE_EVENTS: return False
+        # A grabbed widget (slider drag) keeps receiving the mouse until release
+        if self.captured:
+            widget = self.captured
+            if event.type == pygame.MOUSEBUTTONUP: self.captured = None
+            return widget.handle_event(event)
+        target = self.widget_at(event.pos)
+        if event.type == pygame.MOUSEMOTION and target is not self.hovered:
+            # The widget being left sees the motion too, so it can clear its hover state
+            if self.hovered: self.hovered.handle_event(event)
+            self.hovered = target
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            # Clicking anywhere else closes an open dropdown
+            for widget, _ in self.widgets:
+                if widget is not target and getattr(widget, "is_open", False): widget.is_open = False
+        if target is None: return False
+        handled = target.handle_event(event)
+        if getattr(target, "grabbed", False): self.captured = target
+        return handled